@@ -0,0 +1,777 @@
+#!/usr/bin/env python3
+"""Offline benchmarks for the Facebook screenshot tool.
+
+Every benchmark runs against the local fixture pages in ./fixtures served from
+a local HTTP server, so no traffic goes to facebook.com.
+"""
+import io
+import os
+import json
+import time
+import argparse
+import shutil
+import tempfile
+import threading
+import logging
+import multiprocessing
+import sys
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageChops, ImageStat
+
+import facebook_screenshot as fs
+
+logger = logging.getLogger("benchmark")
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler that keeps request logging out of the benchmark output.
+
+    A ?delay=MS query parameter holds the response back to simulate latency.
+    """
+
+    def do_GET(self):
+        delay = parse_qs(urlparse(self.path).query).get("delay")
+        if delay:
+            time.sleep(int(delay[0]) / 1000)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(directory=FIXTURES_DIR, port=0):
+    """Serve a fixture directory over HTTP from a background thread.
+
+    Args:
+        directory: The directory to serve
+        port: The port to bind, 0 picks a free one
+
+    Returns:
+        tuple: The running server and its base URL
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), partial(QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    logger.info(f"Serving {directory} at {base_url}")
+    return server, base_url
+
+
+class PeakRSS:
+    """Sample this process's resident set size in the background and keep the peak.
+
+    Pillow allocates image buffers outside the Python allocator, so RSS is
+    sampled instead of relying on tracemalloc. Pass measure to sample
+    something else, such as a browser's process tree.
+    """
+
+    def __init__(self, interval=0.005, measure=None):
+        self.interval = interval
+        if measure is not None:
+            self.current = measure
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        """Return the current RSS of this process in bytes."""
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = self.peak = self.current()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+    @property
+    def growth(self):
+        """Peak RSS above the level at entry, in bytes."""
+        return self.peak - self.baseline
+
+
+def summarize(samples):
+    """Reduce a list of measurements to min/median/max."""
+    ordered = sorted(samples)
+    return {"min": ordered[0], "median": ordered[len(ordered) // 2], "max": ordered[-1]}
+
+
+def bench_backends(args):
+    """Compare wall time and peak memory of the cdp and stitch capture backends."""
+    server, base_url = serve_fixtures()
+    driver = fs.setup_driver(headless=not args.disable_headless)
+    try:
+        driver.get(f"{base_url}/{args.page}")
+        fs.wait_for_page_ready(driver, "fixture load")
+        results = {}
+        with tempfile.TemporaryDirectory() as output_dir:
+            for backend in ("cdp", "stitch"):
+                times, memory = [], []
+                for i in range(args.repeat):
+                    with PeakRSS() as rss:
+                        start = time.monotonic()
+                        ok = fs.take_full_page_screenshot(driver, os.path.join(output_dir, f"{backend}_{i}.png"),
+                                                          backend=backend)
+                        elapsed = time.monotonic() - start
+                    if not ok:
+                        raise RuntimeError(f"{backend} backend failed on {args.page}")
+                    times.append(elapsed)
+                    memory.append(rss.growth)
+                results[backend] = {"wall_seconds": summarize(times), "peak_rss_growth_bytes": summarize(memory)}
+        results["speedup"] = results["stitch"]["wall_seconds"]["median"] / results["cdp"]["wall_seconds"]["median"]
+        return results
+    finally:
+        driver.quit()
+        server.shutdown()
+
+
+def write_photos(directory):
+    """Generate the media/photo-N.jpg images the fixture pages show."""
+    os.makedirs(os.path.join(directory, "media"), exist_ok=True)
+    for i in range(1, 11):
+        Image.new("RGB", (680, 280), (37 * i % 255, 119, 242)).save(
+            os.path.join(directory, "media", f"photo-{i}.jpg"), quality=85)
+
+
+def write_media_assets(directory, segments, segment_bytes):
+    """Generate the photos, video segments, fonts and beacons media.html loads.
+
+    The video segments and fonts are random bytes: the browser still downloads
+    them in full, which is all the blocking benchmark measures.
+    """
+    write_photos(directory)
+    for name in ("fonts", "ajax"):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    for i in range(1, 11):
+        for segment in range(segments):
+            with open(os.path.join(directory, "media", f"video-{i}-{segment}.mp4"), "wb") as f:
+                f.write(os.urandom(segment_bytes))
+    for name, size in (("fonts/heavy.woff2", 400_000), ("fonts/icons.woff", 200_000), ("ajax/bz", 64), ("tr", 64)):
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(os.urandom(size))
+
+
+def bench_blocking(args):
+    """Compare page load time and transferred bytes of the request blocking profiles."""
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        shutil.copytree(FIXTURES_DIR, fixture_dir, dirs_exist_ok=True)
+        write_media_assets(fixture_dir, args.segments, args.segment_kb * 1024)
+        server, base_url = serve_fixtures(fixture_dir)
+        url = f"{base_url}/media.html?segments={args.segments}"
+        results = {}
+        try:
+            for profile in args.profiles:
+                driver = fs.setup_driver(headless=not args.disable_headless,
+                                         block_patterns=fs.resolve_block_patterns(profile, []))
+                try:
+                    driver.execute_cdp_cmd("Network.enable", {})
+                    driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+                    times, loads = [], []
+                    for _ in range(args.repeat):
+                        driver.get("about:blank")
+                        driver.request_counter.reset()
+                        start = time.monotonic()
+                        driver.get(url)
+                        fs.wait_for_page_ready(driver, f"{profile} load", signals=("dom", "network"))
+                        times.append(time.monotonic() - start)
+                        loads.append(driver.request_counter.collect())
+                    results[profile] = {
+                        "load_seconds": summarize(times),
+                        "allowed_requests": summarize([load["allowed"] for load in loads]),
+                        "blocked_requests": summarize([load["blocked"] for load in loads]),
+                        "allowed_bytes": summarize([load["allowed_bytes"] for load in loads]),
+                    }
+                finally:
+                    driver.quit()
+                logger.info(f"{profile}: {results[profile]['load_seconds']['median']:.2f}s, "
+                            f"{results[profile]['allowed_bytes']['median'] / 1e6:.1f}MB")
+        finally:
+            server.shutdown()
+    if "full" in results:
+        for profile, result in results.items():
+            result["bytes_saved"] = (results["full"]["allowed_bytes"]["median"]
+                                     - result["allowed_bytes"]["median"])
+            result["speedup"] = results["full"]["load_seconds"]["median"] / result["load_seconds"]["median"]
+    return results
+
+
+def run_e2e_capture(driver, scenario, output_path, **capture_kwargs):
+    """Run one scenario against the page in FACEBOOK_URL and return its measurements.
+
+    "capture_facebook_page" runs the whole pipeline from navigation on, with
+    capture_kwargs; "take_full_page_screenshot" only captures the already
+    loaded page.
+    """
+    browser_rss = PeakRSS(interval=0.05, measure=lambda: fs.browser_rss_bytes(driver) or 0)
+    with PeakRSS() as process_rss, browser_rss, fs.record_capture(fs.FACEBOOK_URL) as recorder:
+        recorder.driver = driver
+        if scenario == "capture_facebook_page":
+            recorder.success = fs.capture_facebook_page(driver, output_path=output_path, **capture_kwargs)
+        else:
+            driver.command_counter.reset()
+            recorder.success = fs.take_full_page_screenshot(driver, output_path)
+    if not recorder.success:
+        raise RuntimeError(f"{scenario} failed on {fs.FACEBOOK_URL}")
+    phases = {}
+    for name, seconds in recorder.phases:
+        phases[name] = phases.get(name, 0.0) + seconds
+    return {
+        "total_seconds": recorder.duration,
+        "phases": phases,
+        "webdriver_commands": sum(c["count"] for c in recorder.fields.get("webdriver_commands", {}).values()),
+        "browser_peak_rss_bytes": browser_rss.peak,
+        "process_peak_rss_growth_bytes": process_rss.growth,
+        "output_bytes": os.path.getsize(output_path),
+    }
+
+
+def summarize_runs(runs):
+    """Reduce the measurements of repeated runs to min/median/max per metric."""
+    summary = {key: summarize([run[key] for run in runs]) for key in runs[0] if key != "phases"}
+    names = dict.fromkeys(name for run in runs for name in run["phases"])
+    summary["phases"] = {name: summarize([run["phases"].get(name, 0.0) for run in runs]) for name in names}
+    return summary
+
+
+def flatten_medians(results, prefix=""):
+    """Map "scenario.metric" paths of a results tree to their median values."""
+    medians = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and "median" in value:
+            medians[path] = value["median"]
+        elif isinstance(value, dict):
+            medians.update(flatten_medians(value, f"{path}."))
+    return medians
+
+
+def find_regressions(results, baseline, tolerance, min_seconds=0.05):
+    """Compare scenario medians with a baseline results file.
+
+    A metric regresses when it grew by more than tolerance (a fraction of the
+    baseline value); timings must also have grown by at least min_seconds so
+    jitter on very short phases is not flagged.
+
+    Returns:
+        list: One entry per regressed metric
+    """
+    current = flatten_medians(results["scenarios"])
+    previous = flatten_medians(baseline["scenarios"])
+    regressions = []
+    for metric, value in sorted(current.items()):
+        before = previous.get(metric)
+        if before is None or value <= before * (1 + tolerance):
+            continue
+        if "seconds" in metric.split(".")[-1] or ".phases." in metric:
+            if value - before < min_seconds:
+                continue
+        regressions.append({"metric": metric, "baseline": before, "current": value,
+                            "change": (value - before) / before if before else None})
+    return regressions
+
+
+def bench_capture_modes(args):
+    """Compare the scroll, elements and cards capture modes on the local profile page."""
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        shutil.copytree(FIXTURES_DIR, fixture_dir, dirs_exist_ok=True)
+        write_photos(fixture_dir)
+        server, base_url = serve_fixtures(fixture_dir)
+        fs.FACEBOOK_URL = f"{base_url}/profile.html?posts={args.posts}&image_delay={args.image_delay}"
+        results = {"url": fs.FACEBOOK_URL, "capture_posts": args.capture_posts, "modes": {}}
+        driver = fs.setup_driver(headless=not args.disable_headless)
+        try:
+            for mode in args.modes:
+                runs = []
+                for i in range(args.repeat):
+                    output_path = os.path.join(fixture_dir, f"{mode}_{i}.png")
+                    runs.append(run_e2e_capture(driver, "capture_facebook_page", output_path,
+                                                capture_mode=mode, capture_posts=args.capture_posts))
+                results["modes"][mode] = summarize_runs(runs)
+            if "scroll" in args.modes:
+                for mode in args.modes:
+                    results["modes"][mode]["difference_from_scroll"] = pixel_difference(
+                        os.path.join(fixture_dir, "scroll_0.png"), os.path.join(fixture_dir, f"{mode}_0.png"))
+                    results["modes"][mode]["speedup"] = (results["modes"]["scroll"]["total_seconds"]["median"]
+                                                         / results["modes"][mode]["total_seconds"]["median"])
+        finally:
+            driver.quit()
+            server.shutdown()
+    return results
+
+
+def bench_e2e(args):
+    """Run the capture pipeline against the local Facebook-like profile page.
+
+    The page is reached through the FACEBOOK_URL override, so the capture
+    code runs unchanged. With --baseline the medians are compared with a
+    stored results file and regressions are reported.
+    """
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        shutil.copytree(FIXTURES_DIR, fixture_dir, dirs_exist_ok=True)
+        write_photos(fixture_dir)
+        server, base_url = serve_fixtures(fixture_dir)
+        fs.FACEBOOK_URL = f"{base_url}/{args.page}?posts={args.posts}&image_delay={args.image_delay}"
+        results = {"url": fs.FACEBOOK_URL, "repeat": args.repeat, "scenarios": {}}
+        driver = fs.setup_driver(headless=not args.disable_headless)
+        try:
+            for scenario in ("capture_facebook_page", "take_full_page_screenshot"):
+                runs = []
+                for i in range(args.repeat):
+                    output_path = os.path.join(fixture_dir, f"{scenario}_{i}.png")
+                    runs.append(run_e2e_capture(driver, scenario, output_path))
+                results["scenarios"][scenario] = summarize_runs(runs)
+                logger.info(f"{scenario}: {results['scenarios'][scenario]['total_seconds']['median']:.2f}s median")
+        finally:
+            driver.quit()
+            server.shutdown()
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["baseline"] = args.baseline
+        results["regressions"] = find_regressions(results, baseline, args.tolerance)
+        for regression in results["regressions"]:
+            logger.warning(f"Regression in {regression['metric']}: {regression['baseline']:g} -> "
+                           f"{regression['current']:g}")
+    return results
+
+
+def pixel_difference(path_a, path_b, threshold=16):
+    """Compare two screenshots of the same size.
+
+    Returns:
+        dict: Mean absolute channel difference (0-255) and the share of
+            pixels whose largest channel difference exceeds threshold
+    """
+    with Image.open(path_a) as a, Image.open(path_b) as b:
+        diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    mean = sum(ImageStat.Stat(diff).mean) / 3
+    r, g, b = diff.split()
+    changed = ImageChops.lighter(ImageChops.lighter(r, g), b).point(lambda v: 255 if v > threshold else 0)
+    changed_share = ImageStat.Stat(changed).mean[0] / 255
+    return {"mean_abs_diff": mean, "changed_pixel_share": changed_share}
+
+
+def bench_render_modes(args):
+    """Compare timing, memory and output pixels of the full and target render modes."""
+    server, base_url = serve_fixtures()
+    driver = fs.setup_driver(headless=not args.disable_headless)
+    try:
+        driver.get(f"{base_url}/{args.page}")
+        fs.wait_for_page_ready(driver, "fixture load")
+        results = {}
+        with tempfile.TemporaryDirectory() as output_dir:
+            for mode in fs.RENDER_MODES:
+                times, memory = [], []
+                for i in range(args.repeat):
+                    with PeakRSS() as rss:
+                        start = time.monotonic()
+                        ok = fs.take_full_page_screenshot(driver, os.path.join(output_dir, f"{mode}_{i}.png"),
+                                                          backend="cdp", render_mode=mode)
+                        elapsed = time.monotonic() - start
+                    if not ok:
+                        raise RuntimeError(f"{mode} render failed on {args.page}")
+                    times.append(elapsed)
+                    memory.append(rss.growth)
+                results[mode] = {"wall_seconds": summarize(times), "peak_rss_growth_bytes": summarize(memory)}
+            results["difference"] = pixel_difference(os.path.join(output_dir, "full_0.png"),
+                                                     os.path.join(output_dir, "target_0.png"))
+        results["speedup"] = results["full"]["wall_seconds"]["median"] / results["target"]["wall_seconds"]["median"]
+        return results
+    finally:
+        driver.quit()
+        server.shutdown()
+
+
+def synthetic_tiles(width, viewport_height, count=4):
+    """Encode a few distinct viewport-sized PNG tiles to stand in for browser screenshots."""
+    tiles = []
+    for i in range(count):
+        image = Image.new("RGB", (width, viewport_height), (240, 242, 245))
+        for y in range(0, viewport_height, 120):
+            shade = (37 * i + y) % 200
+            image.paste((shade, 119, 242 - shade // 2), (100, y + 10, width - 100, y + 90))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        tiles.append(buffer.getvalue())
+    return tiles
+
+
+def compose_tiles(mode, width, viewport_height, height):
+    """Stitch synthetic tiles for a width x height page and resize to the target size.
+
+    "canvas" is the previous full-resolution canvas approach, "streaming"
+    uses StreamingCompositor. Runs in a fresh process so RSS is not shared
+    between measurements.
+
+    Returns:
+        tuple: Wall time in seconds and peak RSS growth in bytes
+    """
+    fs.logger.setLevel(logging.WARNING)
+    tiles = synthetic_tiles(width, viewport_height)
+    step = viewport_height // 2
+    with PeakRSS() as rss:
+        start = time.monotonic()
+        if mode == "canvas":
+            canvas = Image.new("RGB", (width, height))
+            for index, top in enumerate(range(0, height, step)):
+                tile = Image.open(io.BytesIO(tiles[index % len(tiles)]))
+                canvas.paste(tile.crop((0, 0, width, min(viewport_height, height - top))), (0, top))
+        else:
+            compositor = fs.StreamingCompositor(width, height, fs.target_scale(width, height))
+            for index, top in enumerate(range(0, height, step)):
+                with Image.open(io.BytesIO(tiles[index % len(tiles)])) as tile:
+                    compositor.add_tile(tile.convert("RGB"), top)
+            canvas = compositor.image
+        fs.resize_to_target(canvas)
+        elapsed = time.monotonic() - start
+    return elapsed, rss.growth
+
+
+def synthetic_capture(width, height):
+    """Encode a feed-like width x height PNG to stand in for a DevTools capture."""
+    image = Image.new("RGB", (width, height), (240, 242, 245))
+    for y in range(0, height, 300):
+        shade = (y // 300 * 37) % 200
+        image.paste((shade, 119, 242 - shade // 2), (100, y + 20, width - 100, y + 260))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def bench_postprocess(args):
+    """Compare inline post-processing with the PostProcessor pool (no browser).
+
+    Each simulated capture spends --browser-seconds in the "browser" before
+    its PNG is post-processed, so the pool's gain is the overlap of encoding
+    with the next page load.
+    """
+    fs.logger.setLevel(logging.WARNING)
+    payload = ("png", synthetic_capture(args.width, args.height))
+    renditions = fs.parse_renditions(args.renditions)
+    results = {"captures": args.captures, "renditions": args.renditions, "capture_bytes": len(payload[1])}
+    with tempfile.TemporaryDirectory() as output_dir:
+        paths = [os.path.join(output_dir, f"capture_{i}.png") for i in range(args.captures)]
+
+        blocked = []
+        start = time.monotonic()
+        for path in paths:
+            time.sleep(args.browser_seconds)
+            step = time.monotonic()
+            fs.process_capture(payload, path, renditions)
+            blocked.append(time.monotonic() - step)
+        elapsed = time.monotonic() - start
+        results["inline"] = {"wall_seconds": elapsed, "captures_per_second": args.captures / elapsed,
+                             "browser_blocked_seconds": summarize(blocked)}
+
+        for workers in args.workers:
+            postprocessor = fs.PostProcessor(workers, renditions)
+            # Start the worker processes and import the tool in them before timing
+            warmup = ("png", synthetic_capture(8, 8))
+            for future in [postprocessor.pool.submit(fs.decode_capture, warmup) for _ in range(workers)]:
+                future.result()
+            blocked = []
+            start = time.monotonic()
+            for path in paths:
+                time.sleep(args.browser_seconds)
+                step = time.monotonic()
+                postprocessor.submit(payload, path, path)
+                blocked.append(time.monotonic() - step)
+            postprocessor.shutdown()
+            elapsed = time.monotonic() - start
+            results[f"pool_{workers}"] = {"wall_seconds": elapsed, "captures_per_second": args.captures / elapsed,
+                                          "browser_blocked_seconds": summarize(blocked)}
+            logger.info(f"{workers} workers: {args.captures / elapsed:.2f} captures/s vs "
+                        f"{results['inline']['captures_per_second']:.2f} inline")
+    return results
+
+
+def bench_compositor(args):
+    """Compare peak memory of canvas and streaming stitching on synthetic tall pages."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for viewports in args.viewports:
+        height = args.viewport_height * viewports
+        row = {"viewports": viewports, "height": height}
+        for mode in ("canvas", "streaming"):
+            with context.Pool(1) as pool:
+                elapsed, growth = pool.apply(compose_tiles, (mode, args.width, args.viewport_height, height))
+            row[mode] = {"wall_seconds": elapsed, "peak_rss_growth_bytes": growth}
+        results.append(row)
+        logger.info(f"{height}px: canvas {row['canvas']['peak_rss_growth_bytes'] / 1e6:.1f}MB, "
+                    f"streaming {row['streaming']['peak_rss_growth_bytes'] / 1e6:.1f}MB")
+    return results
+
+
+# The banner-removal scripts used before the single-pass overlay engine, kept as the baseline.
+LEGACY_OVERLAY_SCRIPTS = [
+    """
+// Find and remove the login banner at the bottom
+const banners = document.querySelectorAll('div[data-nosnippet]');
+let removed = false;
+
+for (const banner of banners) {
+    if (banner.textContent.includes('Log in or sign up for Facebook') || 
+        banner.textContent.includes('connect with friends') ||
+        banner.textContent.includes('Create new account')) {
+        banner.remove();
+        console.log("Login banner removed");
+        removed = true;
+    }
+}
+
+// Also look for any element containing the specific text
+const allElements = document.querySelectorAll('div');
+for (const elem of allElements) {
+    if (elem.textContent.includes('Log in or sign up for Facebook') && 
+        elem.textContent.includes('connect with friends')) {
+        // Try to find a parent container to remove the entire banner
+        let parent = elem;
+        for (let i = 0; i < 5; i++) {
+            if (parent.parentElement) {
+                parent = parent.parentElement;
+            }
+        }
+        parent.remove();
+        console.log("Found and removed login banner via text content");
+        removed = true;
+        break;
+    }
+}
+
+return removed;
+    """,
+    """
+// Find elements containing the login banner text
+const allDivs = document.querySelectorAll('div');
+let found = false;
+
+for (const div of allDivs) {
+    if (div.textContent && div.textContent.includes('Log in or sign up for Facebook')) {
+        // Navigate up to find a suitable parent to remove
+        let target = div;
+        for (let i = 0; i < 5; i++) {
+            if (target.parentElement) {
+                target = target.parentElement;
+            }
+        }
+        target.remove();
+        found = true;
+        break;
+    }
+}
+
+return found;
+    """,
+]
+
+# Replaces the document body with a synthetic feed of roughly nodeCount elements,
+# ending with a fixed login banner like the one Facebook shows to logged-out visitors.
+SYNTHETIC_DOM_SCRIPT = """
+const nodeCount = arguments[0];
+const main = document.createElement('div');
+main.setAttribute('role', 'main');
+let created = 1;
+while (created < nodeCount) {
+    const post = document.createElement('div');
+    post.setAttribute('role', 'article');
+    let parent = post;
+    for (let depth = 0; depth < 8 && created < nodeCount; depth++) {
+        const child = document.createElement('div');
+        const text = document.createElement('span');
+        text.textContent = 'Synthetic post text ' + created + ' with a few more words to search through.';
+        child.appendChild(text);
+        parent.appendChild(child);
+        parent = child;
+        created += 2;
+    }
+    main.appendChild(post);
+    created += 1;
+}
+const banner = document.createElement('div');
+banner.setAttribute('data-nosnippet', '');
+banner.style.position = 'fixed';
+banner.innerHTML = '<div><div><div><div><div><span>Log in or sign up for Facebook to connect with friends, '
+    + 'family and people you know.</span></div></div></div></div></div><span>Create new account</span>';
+document.body.replaceChildren(main, banner);
+return document.getElementsByTagName('*').length;
+"""
+
+# Runs a script as a function body and returns its in-page duration along with its result.
+TIMED_SCRIPT = """
+const [body, scriptArgs] = arguments;
+const start = performance.now();
+const result = new Function(body).apply(null, scriptArgs);
+return [performance.now() - start, result];
+"""
+
+
+def bench_overlay(args):
+    """Compare the single-pass overlay engine with the legacy banner scripts on synthetic DOMs."""
+    driver = fs.setup_driver(headless=not args.disable_headless)
+    engine_args = [fs.OVERLAY_PHRASES, fs.OVERLAY_SELECTORS, fs.OVERLAY_CONTAINER_SELECTOR, fs.OVERLAY_CLIMB_LEVELS]
+    variants = {
+        "legacy": [(script, []) for script in LEGACY_OVERLAY_SCRIPTS],
+        "engine": [(fs.REMOVE_OVERLAYS_SCRIPT, engine_args)],
+    }
+    try:
+        driver.set_script_timeout(600)
+        driver.get("about:blank")
+        results = []
+        for nodes in args.nodes:
+            row = {"nodes": nodes}
+            for name, scripts in variants.items():
+                times, removed = [], None
+                for _ in range(args.repeat):
+                    row["actual_nodes"] = driver.execute_script(SYNTHETIC_DOM_SCRIPT, nodes)
+                    elapsed = 0.0
+                    for body, script_args in scripts:
+                        script_ms, removed = driver.execute_script(TIMED_SCRIPT, body, script_args)
+                        elapsed += script_ms
+                    times.append(elapsed)
+                banner_left = driver.execute_script("return document.querySelectorAll('[data-nosnippet]').length;")
+                row[name] = {"in_page_ms": summarize(times), "banner_removed": banner_left == 0,
+                             "articles_left": driver.execute_script(
+                                 "return document.querySelectorAll('[role=article]').length;")}
+            row["speedup"] = row["legacy"]["in_page_ms"]["median"] / max(row["engine"]["in_page_ms"]["median"], 1e-3)
+            logger.info(f"{row['actual_nodes']} nodes: legacy {row['legacy']['in_page_ms']['median']:.1f}ms, "
+                        f"engine {row['engine']['in_page_ms']['median']:.1f}ms")
+            results.append(row)
+        return results
+    finally:
+        driver.quit()
+
+
+def bench_batch(args):
+    """Capture the feed fixture as many targets through the batch worker pool."""
+    server, base_url = serve_fixtures()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            targets = [
+                fs.CaptureTarget(f"{base_url}/feed.html?page={i}", os.path.join(output_dir, f"page_{i}.png"))
+                for i in range(args.pages)
+            ]
+            start = time.monotonic()
+            results = fs.run_batch(targets, workers=args.workers, headless=not args.disable_headless)
+            summary = fs.report_batch(results, time.monotonic() - start)
+            summary["workers"] = args.workers
+            summary["pages"] = args.pages
+            summary["targets"] = [
+                {"url": r.target.url, "success": r.success, "duration": r.duration, "error": r.error}
+                for r in results
+            ]
+            return summary
+    finally:
+        server.shutdown()
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Facebook screenshot tool")
+    parser.add_argument("--disable-headless", action="store_true", help="Disable headless mode (shows browser UI)")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    compositor = subparsers.add_parser("compositor", help="Peak memory of canvas vs streaming stitching (no browser)")
+    compositor.add_argument("--width", type=int, default=fs.BROWSER_WIDTH, help="Synthetic viewport width")
+    compositor.add_argument("--viewport-height", type=int, default=fs.BROWSER_HEIGHT, help="Synthetic viewport height")
+    compositor.add_argument("--viewports", type=int, nargs="+", default=[3, 6, 12, 24],
+                            help="Page heights to test, in viewport heights")
+    compositor.set_defaults(func=bench_compositor)
+
+    postprocess = subparsers.add_parser("postprocess", help="Inline vs pooled resize and encode throughput (no browser)")
+    postprocess.add_argument("--width", type=int, default=fs.BROWSER_WIDTH, help="Synthetic capture width")
+    postprocess.add_argument("--height", type=int, default=fs.BROWSER_HEIGHT * 3, help="Synthetic capture height")
+    postprocess.add_argument("--captures", type=int, default=12, help="Number of simulated captures")
+    postprocess.add_argument("--browser-seconds", type=float, default=0.5,
+                             help="Simulated browser time per capture before post-processing")
+    postprocess.add_argument("--renditions", default="420x1250:png,840x2500:webp,210x625:jpeg",
+                             help="Renditions written per capture")
+    postprocess.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="Pool sizes to test")
+    postprocess.set_defaults(func=bench_postprocess)
+
+    overlay = subparsers.add_parser("overlay", help="Overlay engine vs legacy banner scripts on synthetic DOMs")
+    overlay.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000, 50000, 100000],
+                         help="Synthetic DOM sizes in elements")
+    overlay.add_argument("--repeat", type=int, default=3, help="Runs per DOM size and variant")
+    overlay.set_defaults(func=bench_overlay)
+
+    batch = subparsers.add_parser("batch", help="Throughput of the concurrent batch worker pool")
+    batch.add_argument("--pages", type=int, default=8, help="Number of fixture targets to capture")
+    batch.add_argument("--workers", type=int, default=fs.CAPTURE_WORKERS, help="Number of concurrent browsers")
+    batch.set_defaults(func=bench_batch)
+
+    backends = subparsers.add_parser("backends", help="Wall time and peak memory of the capture backends")
+    backends.add_argument("--page", default="feed.html", help="Fixture page to capture")
+    backends.add_argument("--repeat", type=int, default=3, help="Captures per backend")
+    backends.set_defaults(func=bench_backends)
+
+    e2e = subparsers.add_parser("e2e", help="Full capture pipeline on the local profile page, with baseline comparison")
+    e2e.add_argument("--page", default="profile.html", help="Fixture page used as FACEBOOK_URL")
+    e2e.add_argument("--posts", type=int, default=20, help="Posts on the fixture page")
+    e2e.add_argument("--image-delay", type=int, default=200, help="Latency of every lazily loaded photo in ms")
+    e2e.add_argument("--repeat", type=int, default=3, help="Runs per scenario")
+    e2e.add_argument("--baseline", help="Results of an earlier e2e run (from --output) to compare with")
+    e2e.add_argument("--tolerance", type=float, default=0.2,
+                     help="Growth over the baseline median flagged as a regression, as a fraction")
+    e2e.set_defaults(func=bench_e2e)
+
+    capture_modes = subparsers.add_parser("capture-modes", help="Wall time and output of the scroll, elements and cards modes")
+    capture_modes.add_argument("--modes", nargs="+", default=list(fs.CAPTURE_MODES), choices=list(fs.CAPTURE_MODES),
+                               help="Capture modes to compare")
+    capture_modes.add_argument("--posts", type=int, default=20, help="Posts on the fixture page")
+    capture_modes.add_argument("--capture-posts", type=int, default=fs.CAPTURE_POSTS,
+                               help="Posts captured in elements and cards mode")
+    capture_modes.add_argument("--image-delay", type=int, default=200, help="Latency of every lazily loaded photo in ms")
+    capture_modes.add_argument("--repeat", type=int, default=3, help="Captures per mode")
+    capture_modes.set_defaults(func=bench_capture_modes)
+
+    blocking = subparsers.add_parser("blocking", help="Load time and bytes of the request blocking profiles")
+    blocking.add_argument("--profiles", nargs="+", default=list(fs.BLOCK_PROFILES), choices=list(fs.BLOCK_PROFILES),
+                          help="Blocking profiles to compare")
+    blocking.add_argument("--segments", type=int, default=4, help="Video segments streamed per video post")
+    blocking.add_argument("--segment-kb", type=int, default=512, help="Size of each video segment in KB")
+    blocking.add_argument("--repeat", type=int, default=3, help="Page loads per profile")
+    blocking.set_defaults(func=bench_blocking)
+
+    render_modes = subparsers.add_parser("render-modes", help="Timing, memory and pixel difference of the render modes")
+    render_modes.add_argument("--page", default="feed.html", help="Fixture page to capture")
+    render_modes.add_argument("--repeat", type=int, default=3, help="Captures per render mode")
+    render_modes.set_defaults(func=bench_render_modes)
+
+    return parser.parse_args()
+
+
+def main():
+    """Run the selected benchmark and emit its results as JSON."""
+    args = parse_arguments()
+    results = args.func(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Results written to {args.output}")
+    else:
+        print(output)
+    if isinstance(results, dict) and results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
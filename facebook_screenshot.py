@@ -2,17 +2,39 @@
 import os
 import time
 import argparse
+import asyncio
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from PIL import Image
 import logging
 import shutil
 import io
 import base64
+import hashlib
+import heapq
+import json
+import queue
+import random
+import re
+import signal
+import threading
+import bisect
+import cProfile
+import pstats
+import uuid
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
 
 # Set up logging
 logging.basicConfig(
@@ -23,7 +45,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Configuration
-FACEBOOK_URL = "https://www.facebook.com/EMHansele"
+FACEBOOK_URL = os.environ.get("FACEBOOK_URL", "https://www.facebook.com/EMHansele")
 SCREENSHOT_DIR = os.path.dirname(os.path.abspath(__file__))  # Save in the project directory
 SCREENSHOT_FILENAME = "screenshot.png"  # Fixed filename
 SCREENSHOT_PATH = os.path.join(SCREENSHOT_DIR, SCREENSHOT_FILENAME)
@@ -35,8 +57,607 @@ USE_LOGIN = os.environ.get("USE_LOGIN", "false").lower() == "true"
 USE_POPUP_LOGIN = os.environ.get("USE_POPUP_LOGIN", "false").lower() == "true"
 FB_EMAIL = os.environ.get("FB_EMAIL")
 FB_PASSWORD = os.environ.get("FB_PASSWORD")
+# Logged-in sessions (cookies + localStorage) are cached here per account to skip repeated logins
+USE_SESSION_CACHE = os.environ.get("USE_SESSION_CACHE", "true").lower() == "true"
+SESSION_CACHE_DIR = os.environ.get("SESSION_CACHE_DIR", os.path.join(SCREENSHOT_DIR, ".sessions"))
+SESSION_ORIGIN = "https://www.facebook.com"
+SESSION_AUTH_COOKIE = "c_user"  # Only present while logged in
+LOGIN_FORM_XPATH = "//input[@id='email' or @name='email'] | //form[@id='login_popup_cta_form']"
+# Overlays removed before capturing: text phrases whose container is removed, and selectors removed outright
+OVERLAY_PHRASES = [p for p in os.environ.get(
+    "OVERLAY_PHRASES", "Log in or sign up for Facebook|connect with friends|Create new account").split("|") if p]
+OVERLAY_SELECTORS = [s for s in os.environ.get("OVERLAY_SELECTORS", "").split("|") if s]
+OVERLAY_CONTAINER_SELECTOR = os.environ.get("OVERLAY_CONTAINER_SELECTOR", "[data-nosnippet], [role='dialog']")
+OVERLAY_CLIMB_LEVELS = int(os.environ.get("OVERLAY_CLIMB_LEVELS", "5"))
+# Per-capture metrics: JSON lines file (logged when unset) and optional Prometheus endpoint (0 disables it)
+METRICS_LOG = os.environ.get("METRICS_LOG")
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Change detection: skip writing a capture whose perceptual hash is within CHANGE_THRESHOLD bits of the last one
+SKIP_UNCHANGED = os.environ.get("SKIP_UNCHANGED", "false").lower() == "true"
+CHANGE_INDEX_PATH = os.environ.get("CHANGE_INDEX_PATH", os.path.join(SCREENSHOT_DIR, ".change_index.json"))
+CHANGE_THRESHOLD = int(os.environ.get("CHANGE_THRESHOLD", "6"))
+CHANGE_GRID = int(os.environ.get("CHANGE_GRID", "0"))  # Also hash an N x N grid of regions, 0 disables it
+# Output renditions "WIDTHxHEIGHT:FORMAT[:QUALITY]", comma-separated; the first one is written to the output path
+RENDITIONS = os.environ.get("RENDITIONS", "420x1250:png")
+# Processes that resize and encode captures off the browser thread, 0 does it inline
+POSTPROCESS_WORKERS = int(os.environ.get("POSTPROCESS_WORKERS", "0"))
+# Content-addressed archive of every saved capture (disabled when ARCHIVE_DIR is unset) and its retention
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR")
+ARCHIVE_KEEP_LAST = int(os.environ.get("ARCHIVE_KEEP_LAST", "50"))
+ARCHIVE_KEEP_DAYS = int(os.environ.get("ARCHIVE_KEEP_DAYS", "30"))
 # Screenshot interval in seconds (12 hours)
 SCREENSHOT_INTERVAL = 12 * 60 * 60
+# Number of concurrent browser workers used in batch mode
+CAPTURE_WORKERS = int(os.environ.get("CAPTURE_WORKERS", "2"))
+# Scheduler mode: next-run state, +/- fraction of the interval each run is shifted by,
+# concurrent captures per domain and spacing of overdue captures at startup (seconds)
+SCHEDULE_STATE_PATH = os.environ.get("SCHEDULE_STATE_PATH", os.path.join(SCREENSHOT_DIR, ".schedule_state.json"))
+SCHEDULE_JITTER = float(os.environ.get("SCHEDULE_JITTER", "0.1"))
+SCHEDULE_PER_DOMAIN = int(os.environ.get("SCHEDULE_PER_DOMAIN", "1"))
+SCHEDULE_CATCHUP_SPACING = float(os.environ.get("SCHEDULE_CATCHUP_SPACING", "60"))
+# On-demand capture service (0 disables it), its result cache and the number of queued captures it accepts
+SERVICE_HOST = os.environ.get("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("SERVICE_PORT", "0"))
+SERVICE_CACHE_DIR = os.environ.get("SERVICE_CACHE_DIR", os.path.join(SCREENSHOT_DIR, ".capture_cache"))
+SERVICE_CACHE_TTL = int(os.environ.get("SERVICE_CACHE_TTL", "900"))
+SERVICE_CACHE_MAX_ENTRIES = int(os.environ.get("SERVICE_CACHE_MAX_ENTRIES", "100"))
+SERVICE_QUEUE_LIMIT = int(os.environ.get("SERVICE_QUEUE_LIMIT", "8"))
+SERVICE_WAIT_TIMEOUT = int(os.environ.get("SERVICE_WAIT_TIMEOUT", "180"))
+# Warm browser sessions are recycled after this many captures or seconds of age
+DRIVER_MAX_CAPTURES = int(os.environ.get("DRIVER_MAX_CAPTURES", "25"))
+DRIVER_MAX_AGE = int(os.environ.get("DRIVER_MAX_AGE", str(24 * 60 * 60)))
+# Readiness waits: how long the DOM/network must stay quiet, and the upper bound of each signal (ms)
+READY_QUIET_MS = int(os.environ.get("READY_QUIET_MS", "500"))
+READY_DOM_TIMEOUT_MS = int(os.environ.get("READY_DOM_TIMEOUT_MS", "10000"))
+READY_NETWORK_TIMEOUT_MS = int(os.environ.get("READY_NETWORK_TIMEOUT_MS", "10000"))
+READY_FONTS_TIMEOUT_MS = int(os.environ.get("READY_FONTS_TIMEOUT_MS", "5000"))
+READY_IMAGES_TIMEOUT_MS = int(os.environ.get("READY_IMAGES_TIMEOUT_MS", "10000"))
+READY_SIGNALS = ("dom", "network", "fonts", "images")
+# Upper bound for any single script run in the page, and for a page load, in seconds
+SCRIPT_TIMEOUT = int(os.environ.get("SCRIPT_TIMEOUT", "120"))
+PAGE_LOAD_TIMEOUT = int(os.environ.get("PAGE_LOAD_TIMEOUT", "60"))
+# Chrome launch profile: "default" or "low-memory" (fewer processes, small caches, fewer features)
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "default")
+BROWSER_PROFILES = ("default", "low-memory")
+# Watchdog: browser process-tree RSS ceiling in MB (0 disables it), hard per-phase timeouts
+# ("phase=seconds,..." on top of WATCHDOG_PHASE_TIMEOUT for every phase, 0 disables) and sampling interval
+WATCHDOG_RSS_LIMIT_MB = int(os.environ.get("WATCHDOG_RSS_LIMIT_MB", "0"))
+WATCHDOG_PHASE_TIMEOUT = float(os.environ.get("WATCHDOG_PHASE_TIMEOUT", "300"))
+WATCHDOG_PHASE_TIMEOUTS = os.environ.get("WATCHDOG_PHASE_TIMEOUTS", "navigation=120,posts_wait=90,preload=60")
+WATCHDOG_INTERVAL = float(os.environ.get("WATCHDOG_INTERVAL", "1.0"))
+# Size of the saved screenshot
+TARGET_WIDTH = 420
+TARGET_HEIGHT = 1250
+# How the page region is captured: "cdp" (single DevTools call), "stitch" (scroll and stitch) or "auto"
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "auto")
+CAPTURE_BACKENDS = ("auto", "cdp", "stitch")
+# Largest region the DevTools backend captures at full resolution, in pixels; taller regions are
+# captured scaled down by Chrome so their memory use stays bounded
+CDP_MAX_PIXELS = int(os.environ.get("CDP_MAX_PIXELS", "16000000"))
+# Largest width or height Chrome can capture in one Page.captureScreenshot call
+CDP_MAX_DIMENSION = 16384
+# "full" renders at the browser resolution and downsamples; "target" has Chrome rasterize near TARGET_WIDTH x TARGET_HEIGHT
+RENDER_MODE = os.environ.get("RENDER_MODE", "full")
+RENDER_MODES = ("full", "target")
+# Height of the captured region, in viewport heights
+CAPTURE_VIEWPORTS = float(os.environ.get("CAPTURE_VIEWPORTS", "3"))
+# "scroll" captures the top of the page; "elements" the box around the header and the first
+# CAPTURE_POSTS posts; "cards" the same elements captured one by one and stacked
+CAPTURE_MODE = os.environ.get("CAPTURE_MODE", "scroll")
+CAPTURE_MODES = ("scroll", "elements", "cards")
+# Page zoom applied before a scroll mode capture
+PAGE_ZOOM = float(os.environ.get("PAGE_ZOOM", "0.88"))
+# Profile mode: one capture under cProfile and a Chrome trace, written to a new directory in PROFILE_DIR
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+TRACE_CATEGORIES = os.environ.get(
+    "TRACE_CATEGORIES", "devtools.timeline,disabled-by-default-devtools.timeline,blink.user_timing,v8.execute"
+)
+# Generic task wrappers left out of the browser summary, they contain the events that matter
+TRACE_SUMMARY_IGNORED = {"RunTask", "ThreadControllerImpl::RunTask", "ThreadPool_RunTask"}
+# Save an MHTML snapshot of the loaded page next to each screenshot, for offline re-renders
+SAVE_SNAPSHOT = os.environ.get("SAVE_SNAPSHOT", "false").lower() == "true"
+CAPTURE_POSTS = int(os.environ.get("CAPTURE_POSTS", "3"))
+HEADER_SELECTOR = os.environ.get("HEADER_SELECTOR", "[role='main'] > :first-child")
+# Resources the browser is not allowed to load: a named profile plus extra "|"-separated URL patterns
+# ("*" wildcards; "!pattern" drops a pattern of the profile)
+BLOCK_PROFILE = os.environ.get("BLOCK_PROFILE", "full")
+BLOCK_PATTERNS = [p for p in os.environ.get("BLOCK_PATTERNS", "").split("|") if p]
+
+# URL patterns for Network.setBlockedURLs. Images stay allowed in every profile,
+# they are what the screenshot shows.
+BLOCK_MEDIA_PATTERNS = [
+    "*.mp4*", "*.m4s*", "*.m4a*", "*.webm*", "*.m3u8*", "*.mpd*", "*.ts?*", "*.mp3*",
+    "*://video*.fbcdn.net/*",
+]
+BLOCK_FONT_PATTERNS = ["*.woff2*", "*.woff*", "*.ttf*", "*.otf*"]
+BLOCK_TRACKING_PATTERNS = [
+    "*/tr?*", "*/tr/?*", "*/ajax/bz*", "*/ajax/bnzai*", "*/ajax/webstorage/*",
+    "*connect.facebook.net/*", "*doubleclick.net/*", "*google-analytics.com/*",
+    "*googletagmanager.com/*", "*googlesyndication.com/*",
+]
+BLOCK_PROFILES = {
+    "full": [],
+    "no-media": BLOCK_MEDIA_PATTERNS,
+    "minimal": BLOCK_MEDIA_PATTERNS + BLOCK_FONT_PATTERNS + BLOCK_TRACKING_PATTERNS,
+}
+
+# Chrome flags of the low-memory profile: one renderer without site isolation, no GPU
+# process, small disk caches, a capped V8 heap and no background services.
+LOW_MEMORY_CHROME_FLAGS = [
+    "--renderer-process-limit=1",
+    "--disable-site-isolation-trials",
+    "--disable-features=IsolateOrigins,site-per-process,Translate,MediaRouter,OptimizationHints,"
+    "BackForwardCache,InterestFeedContentSuggestions,CalculateNativeWinOcclusion",
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    "--disk-cache-size=33554432",
+    "--media-cache-size=1",
+    "--js-flags=--max-old-space-size=512",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--metrics-recording-only",
+    "--no-first-run",
+    "--mute-audio",
+    "--disable-breakpad",
+]
+
+# Waits in the page for readiness signals and resolves with how long each one took.
+# The observers are installed once per document and keep recording between calls.
+PAGE_READY_SCRIPT = """
+const [signals, quietMs, timeouts, done] = arguments;
+const now = () => performance.now();
+if (!window.__fsReady) {
+    window.__fsReady = {lastMutation: now(), lastResource: now()};
+    new MutationObserver(() => { window.__fsReady.lastMutation = now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    if (window.PerformanceObserver) {
+        new PerformanceObserver(() => { window.__fsReady.lastResource = now(); })
+            .observe({type: 'resource'});
+    }
+}
+const state = window.__fsReady;
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const bounded = (promise, ms) => Promise.race([promise.then(() => true), sleep(ms).then(() => false)]);
+const quiet = async (key, ms, extra) => {
+    const start = now();
+    while (now() - start < ms) {
+        if (now() - state[key] >= quietMs && extra()) return true;
+        await sleep(50);
+    }
+    return false;
+};
+const inViewport = img => {
+    const rect = img.getBoundingClientRect();
+    return rect.bottom >= 0 && rect.top <= window.innerHeight;
+};
+const waits = {
+    dom: () => quiet('lastMutation', timeouts.dom, () => true),
+    network: () => quiet('lastResource', timeouts.network, () => document.readyState === 'complete'),
+    fonts: () => bounded(document.fonts ? document.fonts.ready : Promise.resolve(), timeouts.fonts),
+    images: () => bounded(Promise.all(
+        Array.from(document.images)
+            .filter(img => img.loading !== 'lazy' || inViewport(img))
+            .map(img => img.decode().catch(() => null))
+    ), timeouts.images),
+};
+const result = {};
+Promise.all(signals.map(async name => {
+    const start = now();
+    const ok = await waits[name]();
+    result[name] = {ms: Math.round(now() - start), ok: ok};
+})).then(() => done(result), error => done({error: String(error)}));
+"""
+
+
+@dataclass
+class CaptureTarget:
+    """A page to capture and the path its screenshot is written to.
+
+    interval (seconds, default SCREENSHOT_INTERVAL) and priority (higher
+    first) are only used by the scheduler.
+    """
+    url: str
+    output_path: str
+    interval: Optional[float] = None
+    priority: int = 0
+
+
+@dataclass
+class CaptureResult:
+    """Outcome of capturing a single target in batch mode."""
+    target: CaptureTarget
+    success: bool
+    duration: float
+    worker: int
+    error: Optional[str] = None
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def counter(self, name, help_text):
+        self._metrics[name] = {"type": "counter", "help": help_text, "values": {}}
+
+    def histogram(self, name, help_text, buckets):
+        self._metrics[name] = {"type": "histogram", "help": help_text, "buckets": buckets, "values": {}}
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._metrics[name]["values"]
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics[name]
+            counts, total, count = metric["values"].get(key, ([0] * len(metric["buckets"]), 0.0, 0))
+            counts = [c + (1 if value <= bound else 0) for c, bound in zip(counts, metric["buckets"])]
+            metric["values"][key] = (counts, total + value, count + 1)
+
+    @staticmethod
+    def _labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in metric["values"].items():
+                    if metric["type"] == "counter":
+                        lines.append(f"{name}{self._labels(key)} {value}")
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(metric["buckets"], counts):
+                        lines.append(f"{name}_bucket{self._labels(key, [('le', bound)])} {bucket_count}")
+                    lines.append(f"{name}_bucket{self._labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{self._labels(key)} {total}")
+                    lines.append(f"{name}_count{self._labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+METRICS.histogram("fbshot_phase_duration_seconds", "Duration of each capture phase",
+                  [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300])
+METRICS.counter("fbshot_phase_failures_total", "Capture phases that failed")
+METRICS.counter("fbshot_captures_total", "Captures by result")
+METRICS.histogram("fbshot_image_bytes", "Size of the saved screenshot",
+                  [25e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6])
+METRICS.histogram("fbshot_browser_rss_bytes", "Resident memory of the browser process tree after a capture",
+                  [128e6, 256e6, 512e6, 1e9, 2e9, 4e9, 8e9])
+METRICS.counter("fbshot_webdriver_commands_total", "WebDriver commands issued by captures")
+METRICS.counter("fbshot_requests_total", "Network requests of captured pages by result (allowed, blocked or failed)")
+METRICS.counter("fbshot_request_bytes_total", "Bytes transferred by the allowed requests of captured pages")
+METRICS.counter("fbshot_service_requests_total", "Capture service requests by outcome (cached, coalesced, queued, rejected)")
+METRICS.counter("fbshot_preload_images_total", "Images of the capture region preloaded, by result")
+METRICS.histogram("fbshot_browser_peak_rss_bytes", "Peak resident memory of the browser process tree during a capture",
+                  [128e6, 256e6, 512e6, 1e9, 2e9, 4e9, 8e9])
+METRICS.counter("fbshot_watchdog_kills_total", "Browsers killed by the watchdog, by reason and phase")
+METRICS.counter("fbshot_change_detection_total", "Change detection decisions (processed or skipped)")
+
+class CaptureRecorder:
+    """Phase timings and measurements of a single capture."""
+
+    def __init__(self, target):
+        self.target = target
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.duration = None
+        self.phases = []
+        self.failed_phases = []
+        self.success = False
+        self.fields = {}
+        self.active_phases = []
+        self.first_pixel_at = None
+
+    def add_phase(self, name, seconds, ok=True):
+        self.phases.append((name, seconds))
+        if not ok:
+            self.fail(name)
+
+    def fail(self, name):
+        if name not in self.failed_phases:
+            self.failed_phases.append(name)
+
+    def to_dict(self):
+        return {
+            "target": self.target,
+            "timestamp": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "success": self.success,
+            "duration": self.duration,
+            "phases": [{"phase": name, "seconds": round(seconds, 4)} for name, seconds in self.phases],
+            "failed_phases": self.failed_phases,
+            **self.fields,
+        }
+
+_capture_local = threading.local()
+_metrics_log_lock = threading.Lock()
+
+def current_capture():
+    """Return the CaptureRecorder of the capture running on this thread, if any."""
+    return getattr(_capture_local, "recorder", None)
+
+def note_capture(**fields):
+    """Attach measurements to the current capture record, if one is being recorded."""
+    recorder = current_capture()
+    if recorder is not None:
+        recorder.fields.update(fields)
+
+# Phases that end with the page's pixels in hand, for the startup-to-first-pixel latency
+FIRST_PIXEL_PHASES = ("capture_region", "stitch", "fallback_screenshot")
+
+@contextmanager
+def capture_phase(name):
+    """Time a phase of the current capture; a phase left by an exception counts as failed."""
+    recorder = current_capture()
+    if recorder is None:
+        yield
+        return
+    start = time.monotonic()
+    ok = False
+    # Read by the CaptureWatchdog to enforce phase timeouts
+    recorder.active_phases.append((name, start))
+    try:
+        yield
+        ok = True
+    finally:
+        recorder.active_phases.pop()
+        end = time.monotonic()
+        recorder.add_phase(name, end - start, ok)
+        if ok and name in FIRST_PIXEL_PHASES and recorder.first_pixel_at is None:
+            recorder.first_pixel_at = end
+
+def process_tree_pids(root_pid):
+    """Return root_pid and all of its descendants, read from /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, pending = [], [root_pid]
+    while pending:
+        pid = pending.pop()
+        pids.append(pid)
+        pending.extend(children.get(pid, []))
+    return pids
+
+def process_tree_usage(root_pid):
+    """Return the RSS in bytes and CPU time in seconds of a process and its descendants."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    ticks = os.sysconf("SC_CLK_TCK")
+    rss, cpu = 0, 0.0
+    for pid in process_tree_pids(root_pid):
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * page_size
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss, cpu
+
+def browser_rss_bytes(driver):
+    """Return the resident memory of chromedriver and its browser processes, or None if unknown."""
+    try:
+        root_pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    if not os.path.isdir("/proc"):
+        return None
+    return process_tree_usage(root_pid)[0]
+
+def parse_phase_timeouts(spec):
+    """Parse "phase=DURATION,..." into a dict of per-phase timeouts in seconds."""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid phase timeout '{item}', expected phase=DURATION")
+        timeouts[name.strip()] = parse_duration(value)
+    return timeouts
+
+class CaptureWatchdog:
+    """Sample the browser process tree during a capture and kill it on a violation.
+
+    A background thread samples the RSS and CPU time of the browser
+    processes under chromedriver every interval seconds. When the RSS
+    exceeds rss_limit bytes, or a phase of the capture (see capture_phase)
+    runs longer than its timeout, the browser processes are killed so the
+    pending WebDriver command fails fast; the caller then recycles the
+    session. The peak RSS, CPU time and any kill are noted on the capture.
+    """
+
+    def __init__(self, driver, recorder, rss_limit=0, phase_timeouts=None, default_timeout=0,
+                 interval=WATCHDOG_INTERVAL):
+        self.driver = driver
+        self.recorder = recorder
+        self.rss_limit = rss_limit
+        self.phase_timeouts = phase_timeouts or {}
+        self.default_timeout = default_timeout
+        self.interval = interval
+        self.peak_rss = None
+        self.cpu_start = None
+        self.cpu_seconds = None
+        self.violation = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def root_pid(self):
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+
+    def check_phases(self, now):
+        """Return the (phase, limit) of the first active phase over its timeout, if any."""
+        for name, start in list(self.recorder.active_phases):
+            limit = self.phase_timeouts.get(name, self.default_timeout)
+            if limit and now - start > limit:
+                return name, limit
+        return None
+
+    def sample(self):
+        """Take one sample and return the violation it found, if any."""
+        root_pid = self.root_pid()
+        if root_pid is not None and os.path.isdir("/proc"):
+            rss, cpu = process_tree_usage(root_pid)
+            self.peak_rss = max(self.peak_rss or 0, rss)
+            if self.cpu_start is None:
+                self.cpu_start = cpu
+            self.cpu_seconds = cpu - self.cpu_start
+            if self.rss_limit and rss > self.rss_limit:
+                phases = self.recorder.active_phases
+                return {"reason": "rss", "phase": phases[-1][0] if phases else "none",
+                        "detail": f"browser RSS {rss / 2**20:.0f} MB over the {self.rss_limit / 2**20:.0f} MB limit"}
+        overdue = self.check_phases(time.monotonic())
+        if overdue:
+            name, limit = overdue
+            return {"reason": "timeout", "phase": name, "detail": f"phase '{name}' ran over {limit:g}s"}
+        return None
+
+    def kill_browser(self):
+        """Kill the browser processes, leaving chromedriver up to report the failure."""
+        root_pid = self.root_pid()
+        if root_pid is None:
+            return
+        for pid in process_tree_pids(root_pid)[1:]:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            violation = self.sample()
+            if violation:
+                self.violation = violation
+                logger.error(f"Watchdog killing browser: {violation['detail']}")
+                self.kill_browser()
+                return
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="capture-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self.violation is None:
+            self.sample()
+        if self.peak_rss is not None:
+            self.recorder.fields["browser_peak_rss_bytes"] = self.peak_rss
+            self.recorder.fields["browser_cpu_seconds"] = round(self.cpu_seconds, 3)
+        if self.violation:
+            self.recorder.fields["watchdog_kill"] = {"reason": self.violation["reason"],
+                                                     "phase": self.violation["phase"]}
+        return False
+
+def publish_capture(recorder):
+    """Feed a finished capture record into METRICS and emit it as a JSON line."""
+    for name, seconds in recorder.phases:
+        METRICS.observe("fbshot_phase_duration_seconds", seconds, phase=name)
+    METRICS.observe("fbshot_phase_duration_seconds", recorder.duration, phase="total")
+    for name in recorder.failed_phases:
+        METRICS.inc("fbshot_phase_failures_total", phase=name)
+    METRICS.inc("fbshot_captures_total", result="success" if recorder.success else "failure")
+    if recorder.fields.get("image_bytes") is not None:
+        METRICS.observe("fbshot_image_bytes", recorder.fields["image_bytes"])
+    if recorder.fields.get("browser_rss_bytes") is not None:
+        METRICS.observe("fbshot_browser_rss_bytes", recorder.fields["browser_rss_bytes"])
+    if recorder.fields.get("browser_peak_rss_bytes") is not None:
+        METRICS.observe("fbshot_browser_peak_rss_bytes", recorder.fields["browser_peak_rss_bytes"])
+    kill = recorder.fields.get("watchdog_kill")
+    if kill:
+        METRICS.inc("fbshot_watchdog_kills_total", reason=kill["reason"], phase=kill["phase"])
+    for command, stats in recorder.fields.get("webdriver_commands", {}).items():
+        METRICS.inc("fbshot_webdriver_commands_total", stats["count"], command=command)
+    for result, count in recorder.fields.get("preload", {}).items():
+        METRICS.inc("fbshot_preload_images_total", count, result=result)
+    requests = recorder.fields.get("requests")
+    if requests:
+        for result in ("allowed", "blocked", "failed"):
+            METRICS.inc("fbshot_requests_total", requests[result], result=result)
+        METRICS.inc("fbshot_request_bytes_total", requests["allowed_bytes"])
+    
+    line = json.dumps(recorder.to_dict())
+    if METRICS_LOG:
+        with _metrics_log_lock, open(METRICS_LOG, "a") as f:
+            f.write(line + "\n")
+    else:
+        logger.info(f"Capture metrics: {line}")
+
+@contextmanager
+def record_capture(target):
+    """Record phase timings of the capture run inside this block and publish them at the end.
+
+    Yields:
+        CaptureRecorder: Set .success and .driver on it; the browser RSS,
+            WebDriver command and request counts are read from the driver at the end
+    """
+    recorder = CaptureRecorder(target)
+    recorder.driver = None
+    _capture_local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _capture_local.recorder = None
+        recorder.duration = time.monotonic() - recorder._start
+        if recorder.driver is not None:
+            try:
+                recorder.fields["browser_rss_bytes"] = browser_rss_bytes(recorder.driver)
+            except Exception as e:
+                logger.warning(f"Could not measure browser memory: {e}")
+            counter = getattr(recorder.driver, "command_counter", None)
+            if counter:
+                recorder.fields["webdriver_commands"] = counter.summary()
+            requests = getattr(recorder.driver, "request_counter", None)
+            if requests and requests.stats:
+                recorder.fields["requests"] = dict(requests.stats)
+        publish_capture(recorder)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve METRICS on /metrics."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host=METRICS_HOST):
+    """Serve the Prometheus metrics endpoint from a background thread."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -45,12 +666,178 @@ def parse_arguments():
     parser.add_argument("--use-popup-login", action="store_true", help="Use the popup login dialog instead of removing it")
     parser.add_argument("--email", help="Facebook login email")
     parser.add_argument("--password", help="Facebook login password")
+    parser.add_argument("--no-session-cache", action="store_true",
+                        help="Always log in from scratch instead of reusing a cached login session")
     parser.add_argument("--disable-headless", action="store_true", help="Disable headless mode (shows browser UI)")
     parser.add_argument("--single-run", action="store_true", help="Run once and exit instead of continuous mode")
+    parser.add_argument("--targets", help="File listing pages to capture in batch mode, one 'URL [OUTPUT_PATH]' per line")
+    parser.add_argument("--target", nargs="+", action="append", metavar=("URL", "OUTPUT_PATH"),
+                        help="Page to capture in batch mode, optionally followed by its output path (repeatable)")
+    parser.add_argument("--workers", type=int, default=CAPTURE_WORKERS,
+                        help=f"Number of concurrent browser workers in batch and scheduler mode (default: {CAPTURE_WORKERS})")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Run the built-in scheduler: every target on its own interval, with jitter and concurrency limits")
+    parser.add_argument("--schedule-preview", type=float, metavar="HOURS",
+                        help="Print the captures the scheduler would run in the next HOURS and exit")
+    parser.add_argument("--interval", default=str(SCREENSHOT_INTERVAL),
+                        help=f"Capture interval of targets without their own interval=, e.g. 6h (default: {SCREENSHOT_INTERVAL}s)")
+    parser.add_argument("--serve", type=int, default=SERVICE_PORT, metavar="PORT",
+                        help="Run the on-demand capture HTTP API on this port instead of capturing on a timer")
+    parser.add_argument("--cache-dir", default=SERVICE_CACHE_DIR, help="Where the capture API caches finished captures")
+    parser.add_argument("--cache-ttl", type=int, default=SERVICE_CACHE_TTL,
+                        help=f"Seconds a cached capture is served for (default: {SERVICE_CACHE_TTL})")
+    parser.add_argument("--cache-max-entries", type=int, default=SERVICE_CACHE_MAX_ENTRIES,
+                        help=f"Cached captures kept, least recently used evicted first (default: {SERVICE_CACHE_MAX_ENTRIES})")
+    parser.add_argument("--queue-limit", type=int, default=SERVICE_QUEUE_LIMIT,
+                        help=f"Captures the API queues before answering 429 (default: {SERVICE_QUEUE_LIMIT})")
+    parser.add_argument("--schedule-state", default=SCHEDULE_STATE_PATH,
+                        help="Where the scheduler keeps the next run of every target")
+    parser.add_argument("--schedule-jitter", type=float, default=SCHEDULE_JITTER,
+                        help=f"Shift every run by up to this fraction of its interval (default: {SCHEDULE_JITTER:g})")
+    parser.add_argument("--schedule-per-domain", type=int, default=SCHEDULE_PER_DOMAIN,
+                        help=f"Concurrent captures per domain in scheduler mode (default: {SCHEDULE_PER_DOMAIN})")
+    parser.add_argument("--capture-backend", choices=CAPTURE_BACKENDS, default=CAPTURE_BACKEND,
+                        help=f"How the page region is captured (default: {CAPTURE_BACKEND})")
+    parser.add_argument("--render-mode", choices=RENDER_MODES, default=RENDER_MODE,
+                        help=f"Render at browser resolution or directly at the output size (default: {RENDER_MODE})")
+    parser.add_argument("--capture-mode", choices=CAPTURE_MODES, default=CAPTURE_MODE,
+                        help=f"Capture the top of the page (scroll), the box around the header and first posts "
+                             f"(elements) or those elements stacked as cards (default: {CAPTURE_MODE})")
+    parser.add_argument("--capture-posts", type=int, default=CAPTURE_POSTS,
+                        help=f"Posts captured in elements and cards mode (default: {CAPTURE_POSTS})")
+    parser.add_argument("--capture-viewports", type=float, default=CAPTURE_VIEWPORTS,
+                        help=f"Height of the captured region in viewport heights (default: {CAPTURE_VIEWPORTS:g})")
+    parser.add_argument("--block-profile", choices=list(BLOCK_PROFILES), default=BLOCK_PROFILE,
+                        help=f"Resources the browser does not load: full loads everything, no-media blocks video "
+                             f"and audio, minimal also blocks fonts and trackers (default: {BLOCK_PROFILE})")
+    parser.add_argument("--block-pattern", action="append", metavar="PATTERN",
+                        help="Also block URLs matching this pattern (* wildcards, repeatable); "
+                             "!PATTERN unblocks a pattern of the profile")
+    parser.add_argument("--browser-profile", choices=BROWSER_PROFILES, default=BROWSER_PROFILE,
+                        help=f"Chrome launch profile; low-memory runs one renderer with small caches and "
+                             f"fewer features (default: {BROWSER_PROFILE})")
+    parser.add_argument("--rss-limit-mb", type=int, default=WATCHDOG_RSS_LIMIT_MB,
+                        help=f"Kill and recycle the browser when its processes use more memory than this, "
+                             f"0 for no limit (default: {WATCHDOG_RSS_LIMIT_MB})")
+    parser.add_argument("--phase-timeout", default=WATCHDOG_PHASE_TIMEOUTS, metavar="PHASE=DURATION,...",
+                        help=f"Kill and recycle the browser when a capture phase runs longer than this "
+                             f"(default: {WATCHDOG_PHASE_TIMEOUTS}, other phases {WATCHDOG_PHASE_TIMEOUT:.0f}s)")
+    parser.add_argument("--zoom", type=float, default=PAGE_ZOOM,
+                        help=f"Page zoom applied before a scroll mode capture (default: {PAGE_ZOOM})")
+    parser.add_argument("--save-snapshot", action="store_true", default=SAVE_SNAPSHOT,
+                        help="Also save an MHTML snapshot of the loaded page next to each screenshot")
+    parser.add_argument("--render-snapshot", nargs="+", metavar=("MHTML", "OUTPUT_PATH"),
+                        help="Render a saved snapshot offline and exit; the output defaults to the "
+                             "snapshot name with a -render.png suffix")
+    parser.add_argument("--profile", default=PROFILE_DIR, metavar="DIR",
+                        help="Run a single capture under cProfile and a Chrome trace and write them with a "
+                             "summary to a new directory in DIR")
+    parser.add_argument("--skip-unchanged", action="store_true", default=SKIP_UNCHANGED,
+                        help="Do not rewrite the screenshot when the page looks the same as last time")
+    parser.add_argument("--change-threshold", type=int, default=CHANGE_THRESHOLD,
+                        help=f"Largest perceptual hash distance (bits of 128) treated as unchanged (default: {CHANGE_THRESHOLD})")
+    parser.add_argument("--change-grid", type=int, default=CHANGE_GRID,
+                        help=f"Also compare an N x N grid of region hashes, 0 disables it (default: {CHANGE_GRID})")
+    parser.add_argument("--renditions", default=RENDITIONS,
+                        help=f"Comma-separated WIDTHxHEIGHT:FORMAT[:QUALITY] outputs, the first one written to the "
+                             f"output path; formats: {', '.join(RENDITION_FORMATS)} (default: {RENDITIONS})")
+    parser.add_argument("--postprocess-workers", type=int, default=POSTPROCESS_WORKERS,
+                        help=f"Processes that resize and encode captures off the browser thread, 0 does it inline "
+                             f"(default: {POSTPROCESS_WORKERS})")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR,
+                        help="Also store every saved screenshot in this content-addressed archive")
+    parser.add_argument("--archive-keep-last", type=int, default=ARCHIVE_KEEP_LAST,
+                        help=f"Archive retention: captures always kept per target (default: {ARCHIVE_KEEP_LAST})")
+    parser.add_argument("--archive-keep-days", type=int, default=ARCHIVE_KEEP_DAYS,
+                        help=f"Archive retention: days for which the last capture of each day is kept (default: {ARCHIVE_KEEP_DAYS})")
+    parser.add_argument("--archive-gc", action="store_true",
+                        help="Apply the archive retention policy, delete unreferenced blobs and exit")
+    parser.add_argument("--archive-query", metavar="URL",
+                        help="Print the archived captures of a target as JSON lines and exit")
+    parser.add_argument("--archive-latest", action="store_true", help="With --archive-query, print only the newest capture")
+    parser.add_argument("--since", help="With --archive-query, only captures at or after this ISO date/time")
+    parser.add_argument("--until", help="With --archive-query, only captures before this ISO date/time")
+    parser.add_argument("--metrics-log", default=METRICS_LOG,
+                        help="Append per-capture metrics as JSON lines to this file (default: log them)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve Prometheus metrics on this port, 0 disables the endpoint (default: %(default)s)")
+    parser.add_argument("--driver-max-captures", type=int, default=DRIVER_MAX_CAPTURES,
+                        help=f"Recycle a warm browser after this many captures (default: {DRIVER_MAX_CAPTURES})")
+    parser.add_argument("--driver-max-age", type=int, default=DRIVER_MAX_AGE,
+                        help=f"Recycle a warm browser after this many seconds (default: {DRIVER_MAX_AGE})")
     return parser.parse_args()
 
-def setup_driver(headless=True):
-    """Configure and return a Chrome webdriver instance."""
+def default_output_path(url):
+    """Derive a screenshot path in SCREENSHOT_DIR from a page URL."""
+    parsed = urlparse(url)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{parsed.netloc}{parsed.path}").strip("_")
+    return os.path.join(SCREENSHOT_DIR, f"{slug or 'page'}.png")
+
+def parse_duration(value):
+    """Parse a duration such as "90", "45s", "30m", "12h" or "1d" into seconds."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    value = value.strip().lower()
+    try:
+        if value and value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid duration '{value}', expected a number with an optional s/m/h/d unit")
+
+def load_targets(path):
+    """Read batch targets from a file.
+
+    Each non-empty line holds a URL optionally followed by an output path
+    and by interval=DURATION and priority=N options for the scheduler.
+    Lines starting with '#' are ignored.
+
+    Args:
+        path: The path of the targets file
+
+    Returns:
+        list: The CaptureTarget entries in file order
+    """
+    targets = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            options = dict(part.split("=", 1) for part in parts[1:] if "=" in part)
+            positional = [part for part in parts[1:] if "=" not in part]
+            target = CaptureTarget(parts[0], positional[0] if positional else default_output_path(parts[0]))
+            try:
+                if "interval" in options:
+                    target.interval = parse_duration(options.pop("interval"))
+                if "priority" in options:
+                    target.priority = int(options.pop("priority"))
+            except ValueError as e:
+                raise SystemExit(f"{path}: {e}")
+            if options:
+                raise SystemExit(f"{path}: unknown target options {', '.join(options)}")
+            targets.append(target)
+    return targets
+
+def build_targets(args):
+    """Collect batch targets from --targets and --target arguments."""
+    targets = load_targets(args.targets) if args.targets else []
+    for entry in args.target or []:
+        if len(entry) > 2:
+            raise SystemExit(f"--target takes a URL and an optional output path, got: {' '.join(entry)}")
+        output_path = entry[1] if len(entry) > 1 else default_output_path(entry[0])
+        targets.append(CaptureTarget(entry[0], output_path))
+    return targets
+
+def setup_driver(headless=True, block_patterns=None, profile=None, trace_categories=None):
+    """Configure and return a Chrome webdriver instance.
+
+    Requests matching block_patterns (see resolve_block_patterns) are
+    blocked for the lifetime of the browser. profile (default:
+    BROWSER_PROFILE) "low-memory" adds LOW_MEMORY_CHROME_FLAGS. With
+    trace_categories, chromedriver traces the browser and the trace events
+    are collected by driver.request_counter.
+    """
     chrome_options = Options()
     if headless:
         chrome_options.add_argument("--headless")
@@ -58,13 +845,574 @@ def setup_driver(headless=True):
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument(f"--window-size={BROWSER_WIDTH},{BROWSER_HEIGHT}")
     chrome_options.add_argument("--disable-notifications")
+    if (profile or BROWSER_PROFILE) == "low-memory":
+        for flag in LOW_MEMORY_CHROME_FLAGS:
+            chrome_options.add_argument(flag)
     
     # Add user agent to avoid detection
     chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.45 Safari/537.36")
     
+    # Log network events only, they feed the per-capture request counts
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    perf_logging = {"enableNetwork": True, "enablePage": False}
+    if trace_categories:
+        # chromedriver runs Tracing.start/end itself and logs the events as Tracing.dataCollected
+        perf_logging["traceCategories"] = trace_categories
+    chrome_options.add_experimental_option("perfLoggingPrefs", perf_logging)
+    
     driver = webdriver.Chrome(options=chrome_options)
+    # Async page scripts (readiness waits, stepped scrolling) bound themselves well below this
+    driver.set_script_timeout(SCRIPT_TIMEOUT)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    instrument_driver(driver)
+    driver.request_counter = RequestCounter(driver, trace=bool(trace_categories))
+    if block_patterns:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": block_patterns})
+        logger.info(f"Blocking {len(block_patterns)} URL patterns")
     return driver
 
+class DriverManager:
+    """Keep a warm browser session alive between captures.
+
+    The session is health-checked before every reuse, its tab state is reset
+    between captures, and it is recycled after max_captures captures or once
+    it is older than max_age seconds. Browsers are started with
+    block_patterns blocked, the given launch profile and, with
+    trace_categories, tracing. Every capture runs under a CaptureWatchdog; a
+    browser it kills is replaced before the next capture.
+    """
+
+    def __init__(self, headless=True, max_captures=DRIVER_MAX_CAPTURES, max_age=DRIVER_MAX_AGE,
+                 block_patterns=None, profile=None, rss_limit_mb=WATCHDOG_RSS_LIMIT_MB,
+                 phase_timeouts=None, phase_timeout=WATCHDOG_PHASE_TIMEOUT, trace_categories=None):
+        self.headless = headless
+        self.block_patterns = block_patterns
+        self.profile = profile
+        self.trace_categories = trace_categories
+        self.rss_limit = rss_limit_mb * 1024 * 1024
+        self.phase_timeouts = (parse_phase_timeouts(WATCHDOG_PHASE_TIMEOUTS)
+                               if phase_timeouts is None else phase_timeouts)
+        self.phase_timeout = phase_timeout
+        self.max_captures = max_captures
+        self.max_age = max_age
+        self.driver = None
+        self.created_at = None
+        self.captures = 0
+
+    def is_healthy(self):
+        """Check the current session responds to a cheap script ping."""
+        try:
+            return self.driver.execute_script("return 1;") == 1
+        except Exception as e:
+            logger.warning(f"Browser session failed health check: {e}")
+            return False
+
+    def needs_recycle(self):
+        """Return the reason the current session should be replaced, if any."""
+        if self.captures >= self.max_captures:
+            return f"reached {self.captures} captures"
+        age = time.monotonic() - self.created_at
+        if age >= self.max_age:
+            return f"reached {age:.0f}s of age"
+        if not self.is_healthy():
+            return "failed health check"
+        return None
+
+    def reset_tab_state(self):
+        """Close extra windows and park the remaining tab on a blank page."""
+        handles = self.driver.window_handles
+        for handle in handles[1:]:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        self.driver.switch_to.window(handles[0])
+        self.driver.get("about:blank")
+
+    def acquire(self):
+        """Return a ready driver, starting a new browser only when needed.
+
+        Returns:
+            tuple: The driver and whether it was a warm (reused) session
+        """
+        if self.driver is not None:
+            reason = self.needs_recycle()
+            if reason is None:
+                try:
+                    self.reset_tab_state()
+                    return self.driver, True
+                except Exception as e:
+                    reason = f"tab reset failed: {e}"
+            logger.info(f"Recycling browser session: {reason}")
+            self.close()
+        self.driver = setup_driver(headless=self.headless, block_patterns=self.block_patterns,
+                                   profile=self.profile, trace_categories=self.trace_categories)
+        self.created_at = time.monotonic()
+        self.captures = 0
+        return self.driver, False
+
+    def capture(self, **capture_kwargs):
+        """Run capture_facebook_page on a warm session, recording its phases and startup-to-first-pixel latency."""
+        with record_capture(capture_kwargs.get("url") or FACEBOOK_URL) as recorder:
+            start = time.monotonic()
+            with capture_phase("driver_startup"):
+                driver, warm = self.acquire()
+            recorder.driver = driver
+            ready = time.monotonic()
+            note_capture(warm_session=warm)
+            watchdog = CaptureWatchdog(driver, recorder, rss_limit=self.rss_limit,
+                                       phase_timeouts=self.phase_timeouts, default_timeout=self.phase_timeout)
+            try:
+                with watchdog:
+                    recorder.success = capture_facebook_page(driver, **capture_kwargs)
+                if watchdog.violation:
+                    recorder.success = False
+                return recorder.success
+            finally:
+                self.captures += 1
+                done = time.monotonic()
+                session = f"{'warm' if warm else 'cold'} session, {ready - start:.2f}s to ready driver"
+                if recorder.first_pixel_at is not None:
+                    note_capture(first_pixel_seconds=round(recorder.first_pixel_at - start, 3))
+                    logger.info(f"Startup-to-first-pixel: {recorder.first_pixel_at - start:.1f}s "
+                                f"({session}, {done - start:.1f}s in total)")
+                else:
+                    logger.info(f"No pixels captured after {done - start:.1f}s ({session})")
+                if watchdog.peak_rss is not None:
+                    logger.info(f"Browser peak memory {watchdog.peak_rss / 2**20:.0f} MB, "
+                                f"CPU {watchdog.cpu_seconds:.1f}s")
+                if watchdog.violation:
+                    # The killed browser cannot be reused
+                    logger.info(f"Recycling browser session: {watchdog.violation['detail']}")
+                    self.close()
+
+    def close(self):
+        """Quit the current browser session, if any."""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logger.warning(f"Error quitting browser session: {e}")
+            self.driver = None
+
+def python_hotspots(profile, limit=15):
+    """Return the functions of a cProfile run with the most own time, as (seconds, calls, name)."""
+    stats = pstats.Stats(profile).stats
+    hotspots = [
+        (own, calls, function if filename == "~" else f"{function} ({os.path.basename(filename)}:{line})")
+        for (filename, line, function), (_, calls, own, _, _) in stats.items()
+    ]
+    return sorted(hotspots, reverse=True)[:limit]
+
+def browser_hotspots(events, limit=15):
+    """Return the trace events with the most total duration, as (seconds, count, name).
+
+    Durations are inclusive, so nested events (a Layout inside a
+    FunctionCall) are counted in both.
+    """
+    totals = {}
+    for event in events:
+        if event.get("ph") != "X" or "dur" not in event or event.get("name") in TRACE_SUMMARY_IGNORED:
+            continue
+        seconds, count = totals.get(event["name"], (0.0, 0))
+        totals[event["name"]] = (seconds + event["dur"] / 1e6, count + 1)
+    return sorted(((seconds, count, name) for name, (seconds, count) in totals.items()), reverse=True)[:limit]
+
+def profile_capture(manager, directory, **capture_kwargs):
+    """Run one capture under cProfile and a Chrome trace and write both with a summary.
+
+    The manager must trace its browser (trace_categories). A new directory
+    named after the time and target in directory receives python.prof (for
+    pstats or snakeviz), trace.json (for chrome://tracing or Perfetto) and
+    summary.txt with the top Python hotspots, WebDriver round trips and
+    browser events.
+
+    Returns:
+        tuple: Whether the capture succeeded and the profile directory
+    """
+    url = capture_kwargs.get("url") or FACEBOOK_URL
+    slug = os.path.splitext(os.path.basename(default_output_path(url)))[0]
+    capture_dir = os.path.join(directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{slug}")
+    os.makedirs(capture_dir, exist_ok=True)
+    
+    profile = cProfile.Profile()
+    start = time.monotonic()
+    profile.enable()
+    try:
+        success = manager.capture(**capture_kwargs)
+    finally:
+        profile.disable()
+    elapsed = time.monotonic() - start
+    
+    profile.dump_stats(os.path.join(capture_dir, "python.prof"))
+    driver = manager.driver
+    counter = getattr(driver, "command_counter", None)
+    requests = getattr(driver, "request_counter", None)
+    events = requests.trace if requests and requests.trace is not None else []
+    if events:
+        with open(os.path.join(capture_dir, "trace.json"), "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    else:
+        logger.warning("No browser trace was recorded for this capture")
+    
+    lines = [f"Capture of {url}: {'succeeded' if success else 'failed'} in {elapsed:.2f}s", "",
+             "Top Python functions by own time:"]
+    lines += [f"  {seconds:8.3f}s {calls:8d} calls  {name}" for seconds, calls, name in python_hotspots(profile)]
+    if counter:
+        lines += ["", f"WebDriver round trips: {counter.total_commands} commands in {counter.total_seconds:.2f}s"]
+        lines += [f"  {stats['seconds']:8.3f}s {stats['count']:8d} x  {command}"
+                  for command, stats in list(counter.summary().items())[:10]]
+    if events:
+        lines += ["", "Top browser events by total duration (inclusive):"]
+        lines += [f"  {seconds:8.3f}s {count:8d} x  {name}" for seconds, count, name in browser_hotspots(events)]
+    summary = "\n".join(lines) + "\n"
+    with open(os.path.join(capture_dir, "summary.txt"), "w") as f:
+        f.write(summary)
+    logger.info(f"Profile written to {capture_dir}:\n{summary}")
+    return success, capture_dir
+
+# Page control scripts: each one batches related queries and actions into a single
+# WebDriver round trip.
+
+# Scrolls to the top and measures the page.
+PAGE_METRICS_SCRIPT = """
+window.scrollTo(0, 0);
+return {
+    total_height: Math.max(document.body.scrollHeight, document.body.offsetHeight,
+        document.documentElement.clientHeight, document.documentElement.scrollHeight,
+        document.documentElement.offsetHeight),
+    viewport_width: document.documentElement.clientWidth,
+    viewport_height: document.documentElement.clientHeight,
+};
+"""
+
+# Loads every image in the top `viewports` viewport heights (at the given zoom, which APPLY_ZOOM_SCRIPT applies
+# through both CSS zoom and a scale transform, so the page shrinks by zoom squared) at once: lazy images are made
+# eager, data-src placeholders are swapped in, the region is stepped through a viewport at
+# a time so IntersectionObserver loaders fire, and CSS background images are fetched too.
+# All images are then decoded in parallel; resolves with how many loaded, failed or timed out.
+PRELOAD_IMAGES_SCRIPT = """
+const [viewports, zoom, timeoutMs, done] = arguments;
+const height = Math.ceil(window.innerHeight * viewports / (zoom * zoom));
+const frame = () => new Promise(resolve => requestAnimationFrame(() => resolve()));
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const inRegion = element => {
+    const rect = element.getBoundingClientRect();
+    const top = rect.top + window.scrollY;
+    return rect.width > 0 && rect.height > 0 && top < height && top + rect.height > 0;
+};
+(async () => {
+    const start = performance.now();
+    // Step through the region a viewport at a time so observers see every element
+    let steps = 0;
+    for (let y = 0; y < height; y += window.innerHeight) {
+        window.scrollTo(0, y);
+        steps++;
+        await frame();
+        await frame();
+    }
+    window.scrollTo(0, 0);
+
+    const images = Array.from(document.images).filter(inRegion);
+    for (const image of images) {
+        if (image.loading === 'lazy') image.loading = 'eager';
+        if (image.dataset.srcset && !image.srcset) image.srcset = image.dataset.srcset;
+        if (image.dataset.src && !image.currentSrc && !image.getAttribute('src')) image.src = image.dataset.src;
+    }
+    const urls = new Set();
+    for (const element of document.body.getElementsByTagName('*')) {
+        const background = getComputedStyle(element).backgroundImage;
+        if (background && background !== 'none' && inRegion(element)) {
+            for (const match of background.matchAll(/url\\(["']?(.*?)["']?\\)/g)) urls.add(match[1]);
+        }
+    }
+    const backgrounds = Array.from(urls, url => {
+        const image = new Image();
+        image.src = url;
+        return image;
+    });
+
+    const counts = {loaded: 0, failed: 0, timed_out: 0, no_source: 0};
+    const pending = [];
+    for (const image of images.concat(backgrounds)) {
+        if (!image.currentSrc && !image.getAttribute('src')) {
+            counts.no_source++;
+            continue;
+        }
+        const entry = {state: 'pending'};
+        pending.push(entry);
+        entry.promise = image.decode().then(
+            () => { entry.state = 'loaded'; },
+            () => { entry.state = image.complete && image.naturalWidth > 0 ? 'loaded' : 'failed'; }
+        );
+    }
+    await Promise.race([Promise.all(pending.map(entry => entry.promise)), sleep(timeoutMs)]);
+    for (const entry of pending) {
+        counts[entry.state === 'pending' ? 'timed_out' : entry.state]++;
+    }
+    done(Object.assign(counts, {
+        height: height,
+        images: images.length,
+        backgrounds: backgrounds.length,
+        steps: steps,
+        elapsed_ms: Math.round(performance.now() - start),
+    }));
+})();
+"""
+
+# Scrolls back to the top and applies the CSS zoom used for the screenshot.
+APPLY_ZOOM_SCRIPT = """
+const zoom = arguments[0];
+window.scrollTo(0, 0);
+document.body.style.zoom = String(zoom);
+document.body.style.transformOrigin = "0 0";
+document.body.style.transform = "scale(" + zoom + ")";
+document.body.style.width = (100 / zoom) + "%";
+return {zoom: zoom, scroll_y: window.pageYOffset};
+"""
+
+RESET_ZOOM_SCRIPT = """
+document.body.style.zoom = "1";
+document.body.style.transform = "none";
+document.body.style.width = "100%";
+"""
+
+# Finds the header and the first posts (not posts nested in posts), scrolls each one into
+# view once so lazy loaders fire, waits for their images and resolves with their boxes in
+# page coordinates.
+ELEMENT_REGIONS_SCRIPT = """
+const [headerSelector, count, timeoutMs, done] = arguments;
+const postSelector = "[role='article']";
+const header = headerSelector ? document.querySelector(headerSelector) : null;
+const posts = Array.from(document.querySelectorAll(postSelector))
+    .filter(post => !post.parentElement.closest(postSelector))
+    .slice(0, count);
+const frame = () => new Promise(resolve => requestAnimationFrame(() => resolve()));
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const box = element => {
+    const rect = element.getBoundingClientRect();
+    return {x: rect.left + window.scrollX, y: rect.top + window.scrollY, width: rect.width, height: rect.height};
+};
+(async () => {
+    const start = performance.now();
+    const images = [];
+    for (const element of (header ? [header] : []).concat(posts)) {
+        element.scrollIntoView({block: 'center'});
+        await frame();
+        await frame();
+        for (const image of element.querySelectorAll('img')) {
+            image.loading = 'eager';
+            images.push(image);
+        }
+    }
+    window.scrollTo(0, 0);
+    const loads = images.map(image => image.complete ? null : image.decode().catch(() => null));
+    await Promise.race([Promise.all(loads), sleep(timeoutMs)]);
+    done({
+        header: header ? box(header) : null,
+        posts: posts.map(box),
+        images: images.length,
+        images_loaded: images.filter(image => image.complete && image.naturalWidth > 0).length,
+        elapsed_ms: Math.round(performance.now() - start),
+    });
+})();
+"""
+
+class CommandCounter:
+    """Count the WebDriver commands a driver issues and the time spent per command type."""
+
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, command, seconds):
+        count, total = self.stats.get(command, (0, 0.0))
+        self.stats[command] = (count + 1, total + seconds)
+
+    def reset(self):
+        self.stats = {}
+
+    @property
+    def total_commands(self):
+        return sum(count for count, _ in self.stats.values())
+
+    @property
+    def total_seconds(self):
+        return sum(total for _, total in self.stats.values())
+
+    def summary(self):
+        """Return per-command counts and seconds, most time-consuming first."""
+        return {
+            command: {"count": count, "seconds": total}
+            for command, (count, total) in sorted(self.stats.items(), key=lambda item: -item[1][1])
+        }
+
+    def report(self, label):
+        """Log the commands issued since the last reset."""
+        details = ", ".join(
+            f"{command} x{stats['count']} ({stats['seconds']:.2f}s)" for command, stats in self.summary().items()
+        )
+        logger.info(f"{label}: {self.total_commands} WebDriver commands in {self.total_seconds:.2f}s - {details}")
+
+def instrument_driver(driver):
+    """Route every WebDriver command of a driver through a CommandCounter.
+
+    Every Selenium call ends up in WebDriver.execute, so wrapping it on the
+    instance counts all commands, including scripts and DevTools calls.
+
+    Returns:
+        CommandCounter: The counter, also available as driver.command_counter
+    """
+    counter = CommandCounter()
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        start = time.monotonic()
+        try:
+            return execute(driver_command, params)
+        finally:
+            counter.record(driver_command, time.monotonic() - start)
+
+    driver.execute = counted_execute
+    driver.command_counter = counter
+    return counter
+
+def resolve_block_patterns(profile=None, patterns=None):
+    """Return the URL patterns to block for a profile plus extra rules.
+
+    Args:
+        profile: A BLOCK_PROFILES name (default: BLOCK_PROFILE)
+        patterns: Extra patterns to block; "!pattern" removes that pattern
+            from the profile instead (default: BLOCK_PATTERNS)
+
+    Returns:
+        list: The patterns for Network.setBlockedURLs
+    """
+    profile = profile or BLOCK_PROFILE
+    if profile not in BLOCK_PROFILES:
+        raise ValueError(f"Unknown block profile '{profile}', expected one of {', '.join(BLOCK_PROFILES)}")
+    patterns = BLOCK_PATTERNS if patterns is None else patterns
+    allowed = {p[1:] for p in patterns if p.startswith("!")}
+    blocked = [p for p in BLOCK_PROFILES[profile] + [p for p in patterns if not p.startswith("!")]
+               if p not in allowed]
+    return list(dict.fromkeys(blocked))
+
+class RequestCounter:
+    """Count the network requests a page makes, read from Chrome's performance log.
+
+    Requests stopped by Network.setBlockedURLs fail with the "inspector"
+    blocked reason; every other failure (aborted, refused) counts as failed.
+    Bytes are the encoded sizes of finished requests; blocked requests never
+    transfer anything, so their size is unknown. When the browser is traced
+    (see setup_driver), the trace events of the log are kept in .trace.
+    """
+
+    def __init__(self, driver, trace=False):
+        self.driver = driver
+        self.stats = {}
+        self.trace = [] if trace else None
+
+    def _events(self):
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception:
+            return
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            if message.get("method") == "Tracing.dataCollected":
+                if self.trace is not None:
+                    params = message.get("params", {})
+                    self.trace.extend(params["value"] if "value" in params else [params])
+                continue
+            yield message.get("method"), message.get("params", {})
+
+    def reset(self):
+        """Drop the events logged so far and start counting from zero."""
+        for _ in self._events():
+            pass
+        if self.trace is not None:
+            self.trace.clear()
+        self.stats = {"allowed": 0, "blocked": 0, "failed": 0, "allowed_bytes": 0}
+
+    def collect(self):
+        """Add the events logged since the last call and return the totals."""
+        for method, params in self._events():
+            if method == "Network.loadingFinished":
+                self.stats["allowed"] += 1
+                self.stats["allowed_bytes"] += int(params.get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed":
+                self.stats["blocked" if params.get("blockedReason") == "inspector" else "failed"] += 1
+        return dict(self.stats)
+
+    def report(self, label):
+        """Log the requests counted since the last reset."""
+        stats = self.collect()
+        logger.info(f"{label}: {stats['allowed']} requests loaded ({stats['allowed_bytes'] / 1e6:.2f}MB), "
+                    f"{stats['blocked']} blocked, {stats['failed']} failed")
+
+def preload_images(driver, viewports=None, zoom=1.0, timeout_ms=READY_IMAGES_TIMEOUT_MS):
+    """Load and decode every image of the capture region in parallel, in one round trip.
+
+    Args:
+        driver: The Selenium WebDriver
+        viewports: Height of the region in viewport heights (default: CAPTURE_VIEWPORTS)
+        zoom: Zoom passed to APPLY_ZOOM_SCRIPT for the capture; a smaller zoom fits more of the page
+        timeout_ms: How long to wait for the images to decode
+
+    Returns:
+        dict: Counts of images loaded, failed, timed out and without a
+            source, the number of <img> and CSS background images found and
+            the region height
+    """
+    viewports = viewports or CAPTURE_VIEWPORTS
+    result = driver.execute_async_script(PRELOAD_IMAGES_SCRIPT, viewports, zoom, timeout_ms)
+    note_capture(preload={key: result[key] for key in ("loaded", "failed", "timed_out", "no_source")})
+    return result
+
+def wait_for_page_ready(driver, phase, signals=READY_SIGNALS, quiet_ms=READY_QUIET_MS, timeout_scale=1.0):
+    """Wait until the page is idle instead of sleeping for a fixed time.
+
+    All requested signals are awaited concurrently inside the page:
+
+    - dom: no DOM mutations for quiet_ms
+    - network: document loaded and no new resource fetched for quiet_ms
+    - fonts: document.fonts.ready resolved
+    - images: every eager or in-viewport image decoded
+
+    Each signal gives up after its READY_*_TIMEOUT_MS bound (times timeout_scale).
+
+    Args:
+        driver: The Selenium WebDriver
+        phase: Name of the capture phase, used in the log line
+        signals: The signals to wait for
+        quiet_ms: How long the DOM/network must stay quiet
+        timeout_scale: Factor applied to every upper bound
+
+    Returns:
+        dict: Per-signal wait time in ms and whether it was met, or None on error
+    """
+    timeouts = {
+        "dom": int(READY_DOM_TIMEOUT_MS * timeout_scale),
+        "network": int(READY_NETWORK_TIMEOUT_MS * timeout_scale),
+        "fonts": int(READY_FONTS_TIMEOUT_MS * timeout_scale),
+        "images": int(READY_IMAGES_TIMEOUT_MS * timeout_scale),
+    }
+    start = time.monotonic()
+    try:
+        result = driver.execute_async_script(PAGE_READY_SCRIPT, list(signals), quiet_ms, timeouts)
+    except Exception as e:
+        logger.warning(f"[{phase}] readiness wait failed after {time.monotonic() - start:.2f}s: {e}")
+        return None
+    if "error" in result:
+        logger.warning(f"[{phase}] readiness wait failed: {result['error']}")
+        return None
+    details = ", ".join(
+        f"{name} {result[name]['ms']}ms{'' if result[name]['ok'] else ' (bound hit)'}" for name in signals
+    )
+    logger.info(f"[{phase}] page ready in {time.monotonic() - start:.2f}s: {details}")
+    return result
+
 def login_to_facebook(driver):
     """Log in to Facebook using provided credentials."""
     try:
@@ -145,14 +1493,207 @@ def login_via_popup(driver, email, password):
         logger.error(f"Popup login failed: {e}")
         return False
 
+class LoginSessionStore:
+    """On-disk cache of logged-in Facebook sessions, keyed by account.
+
+    After a successful login the cookies and localStorage are saved; later
+    drivers get them restored before navigating, and only fall back to a
+    full login when the restored session turns out to be invalid.
+    """
+
+    def __init__(self, directory=SESSION_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+        self._lock = threading.Lock()
+
+    def path(self, account):
+        """Return the cache file of an account without putting the address in the filename."""
+        key = hashlib.sha256(account.strip().lower().encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{key}.json")
+
+    @property
+    def hit_rate(self):
+        """Share of lookups that were served by a valid cached session."""
+        lookups = self.hits + self.misses + self.invalid
+        return self.hits / lookups if lookups else 0.0
+
+    def _record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            lookups = self.hits + self.misses + self.invalid
+            outcome = {"hits": "hit", "misses": "miss", "invalid": "invalid session"}[counter]
+            logger.info(f"Session cache {outcome}: hit rate {self.hit_rate:.0%} over {lookups} lookups")
+
+    def save(self, driver, account):
+        """Save the cookies and localStorage of a logged-in driver."""
+        try:
+            session = {
+                "saved_at": time.time(),
+                "cookies": driver.get_cookies(),
+                "local_storage": driver.execute_script("return Object.assign({}, window.localStorage);"),
+            }
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            path = self.path(account)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(session, f)
+            os.replace(tmp_path, path)
+            logger.info(f"Saved login session with {len(session['cookies'])} cookies")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not save login session: {e}")
+            return False
+
+    def discard(self, account):
+        """Delete the cached session of an account."""
+        try:
+            os.remove(self.path(account))
+        except FileNotFoundError:
+            pass
+
+    def restore(self, driver, account):
+        """Load the cached session of an account into the driver.
+
+        Cookies are attached on a cheap same-origin page, so the target page
+        can be loaded logged in right away.
+
+        Returns:
+            bool: True if a usable session was restored
+        """
+        try:
+            with open(self.path(account)) as f:
+                session = json.load(f)
+        except FileNotFoundError:
+            self._record("misses")
+            return False
+        except Exception as e:
+            logger.warning(f"Could not read cached login session: {e}")
+            self._record("misses")
+            return False
+        
+        now = time.time()
+        cookies = [cookie for cookie in session["cookies"] if cookie.get("expiry", now + 1) > now]
+        if not any(cookie["name"] == SESSION_AUTH_COOKIE for cookie in cookies):
+            logger.info("Cached login session has expired")
+            self.discard(account)
+            self._record("misses")
+            return False
+        
+        try:
+            driver.get(f"{SESSION_ORIGIN}/robots.txt")
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+            driver.execute_script(
+                "for (const [key, value] of Object.entries(arguments[0])) { localStorage.setItem(key, value); }",
+                session.get("local_storage") or {}
+            )
+        except Exception as e:
+            logger.warning(f"Could not restore cached login session: {e}")
+            self._record("misses")
+            return False
+        logger.info(f"Restored login session saved {(now - session['saved_at']) / 3600:.1f}h ago")
+        return True
+
+    def validate(self, driver, account):
+        """Check a restored session is still logged in on the current page.
+
+        Facebook drops the auth cookie and shows a login form when it rejects
+        a session, so this needs no extra navigation. Invalid sessions are
+        discarded.
+        """
+        try:
+            valid = (any(cookie["name"] == SESSION_AUTH_COOKIE for cookie in driver.get_cookies())
+                     and not driver.find_elements(By.XPATH, LOGIN_FORM_XPATH))
+        except Exception as e:
+            logger.warning(f"Could not validate restored login session: {e}")
+            valid = False
+        if valid:
+            self._record("hits")
+        else:
+            logger.info("Restored login session is no longer valid")
+            self.discard(account)
+            self._record("invalid")
+        return valid
+
+# Removes overlays in a single TreeWalker pass over the text nodes, so the cost is
+# linear in DOM size. A phrase match outside posts is removed with its overlay
+# container: the closest container selector match, else a fixed/sticky element
+# within climbLevels ancestors. Matches in no container and containers holding
+# the main content are kept.
+REMOVE_OVERLAYS_SCRIPT = """
+const [phrases, selectors, containerSelector, climbLevels] = arguments;
+const protectedSelector = "[role='main'], [role='article']";
+const removed = [];
+const removable = el => el && el !== document.body && el !== document.documentElement
+    && !el.matches(protectedSelector) && !el.querySelector(protectedSelector);
+const remove = (el, reason) => {
+    removed.push({tag: el.tagName.toLowerCase(), reason: reason, text: el.textContent.trim().slice(0, 80)});
+    el.remove();
+};
+for (const selector of selectors) {
+    for (const el of document.querySelectorAll(selector)) {
+        if (el.isConnected && removable(el)) remove(el, selector);
+    }
+}
+const findContainer = node => {
+    const container = node.parentElement.closest(containerSelector);
+    if (container) return container;
+    let el = node.parentElement;
+    for (let depth = 0; el && depth < climbLevels; depth++, el = el.parentElement) {
+        const position = getComputedStyle(el).position;
+        if (position === 'fixed' || position === 'sticky') return el;
+    }
+    return null;
+};
+const matches = [];
+if (phrases.length && document.body) {
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        const phrase = phrases.find(p => node.data.includes(p));
+        // Post text may quote a phrase; posts are never overlays
+        if (phrase && !node.parentElement.closest("[role='article']")) matches.push([node, phrase]);
+    }
+}
+for (const [node, phrase] of matches) {
+    if (!node.isConnected) continue;
+    const container = findContainer(node);
+    if (removable(container)) remove(container, phrase);
+}
+return removed;
+"""
+
+def remove_overlays(driver, phrases=None, selectors=None):
+    """Remove login banners and other overlays from the page in a single pass.
+
+    Args:
+        driver: The Selenium WebDriver
+        phrases: Text phrases identifying overlays (default: OVERLAY_PHRASES)
+        selectors: CSS selectors of elements to remove outright (default: OVERLAY_SELECTORS)
+
+    Returns:
+        list: One dict per removed element with its tag, the phrase or
+            selector that matched and the start of its text
+    """
+    try:
+        return driver.execute_script(
+            REMOVE_OVERLAYS_SCRIPT,
+            OVERLAY_PHRASES if phrases is None else phrases,
+            OVERLAY_SELECTORS if selectors is None else selectors,
+            OVERLAY_CONTAINER_SELECTOR,
+            OVERLAY_CLIMB_LEVELS
+        ) or []
+    except Exception as e:
+        logger.warning(f"Error removing overlays: {e}")
+        return []
+
 def remove_login_overlay(driver):
     """Remove the login overlay by clicking the Close button instead of modifying HTML."""
     try:
         logger.info("Checking for login overlay...")
         
-        # Wait for a short time to ensure popup has appeared if it's going to
-        time.sleep(2)
-        
         # Try to find the Close button using aria-label attribute
         try:
             close_button = WebDriverWait(driver, 5).until(
@@ -162,55 +1703,8 @@ def remove_login_overlay(driver):
             close_button.click()
             logger.info("Successfully clicked the Close button")
             
-            # Give it a moment to dismiss
-            time.sleep(1)
-            
-            # Also remove the login banner at the bottom if present
-            try:
-                logger.info("Attempting to remove login banner...")
-                remove_banner_script = """
-                // Find and remove the login banner at the bottom
-                const banners = document.querySelectorAll('div[data-nosnippet]');
-                let removed = false;
-                
-                for (const banner of banners) {
-                    if (banner.textContent.includes('Log in or sign up for Facebook') || 
-                        banner.textContent.includes('connect with friends') ||
-                        banner.textContent.includes('Create new account')) {
-                        banner.remove();
-                        console.log("Login banner removed");
-                        removed = true;
-                    }
-                }
-                
-                // Also look for any element containing the specific text
-                const allElements = document.querySelectorAll('div');
-                for (const elem of allElements) {
-                    if (elem.textContent.includes('Log in or sign up for Facebook') && 
-                        elem.textContent.includes('connect with friends')) {
-                        // Try to find a parent container to remove the entire banner
-                        let parent = elem;
-                        for (let i = 0; i < 5; i++) {
-                            if (parent.parentElement) {
-                                parent = parent.parentElement;
-                            }
-                        }
-                        parent.remove();
-                        console.log("Found and removed login banner via text content");
-                        removed = true;
-                        break;
-                    }
-                }
-                
-                return removed;
-                """
-                banner_removed = driver.execute_script(remove_banner_script)
-                if banner_removed:
-                    logger.info("Successfully removed login banner")
-                else:
-                    logger.info("No login banner found or couldn't be removed")
-            except Exception as e:
-                logger.warning(f"Error removing login banner: {e}")
+            # Wait for the dismissal to settle
+            wait_for_page_ready(driver, "overlay dismissed", signals=("dom",), quiet_ms=200)
             
             return True
         except Exception as e:
@@ -224,7 +1718,7 @@ def remove_login_overlay(driver):
                     logger.info("Found Close button with broader selector, clicking it...")
                     close_buttons[0].click()
                     logger.info("Successfully clicked the Close button")
-                    time.sleep(1)
+                    wait_for_page_ready(driver, "overlay dismissed", signals=("dom",), quiet_ms=200)
                     return True
                 else:
                     logger.info("No Close button found with broader selector")
@@ -238,116 +1732,1527 @@ def remove_login_overlay(driver):
         logger.warning(f"Error while trying to remove login overlay: {e}")
         return False
 
-def take_full_page_screenshot(driver, filepath):
-    """Take a screenshot of the upper third of the page by scrolling.
-    
+def get_capture_region(driver, viewports=None):
+    """Measure the page and decide how much of it to capture.
+
     Args:
         driver: The Selenium WebDriver
-        filepath: The path where the screenshot should be saved
+        viewports: Capture height in viewport heights (default: CAPTURE_VIEWPORTS)
+
+    The page is left scrolled to the top.
+
+    Returns:
+        tuple: Viewport width, viewport height and the height to capture
+    """
+    # Measure the document and viewport in one round trip (this also scrolls to the top)
+    metrics = driver.execute_script(PAGE_METRICS_SCRIPT)
+    total_height = metrics["total_height"]
+    viewport_width = metrics["viewport_width"]
+    viewport_height = metrics["viewport_height"]
+    logger.info(f"Total document height: {total_height}px")
+    logger.info(f"Viewport dimensions: {viewport_width}x{viewport_height}")
     
+    # Limit to a number of viewport heights (a third of a typical page by default)
+    max_capture_height = min(int(viewport_height * (viewports or CAPTURE_VIEWPORTS)), total_height)
+    logger.info(f"Limiting screenshot to height: {max_capture_height}px")
+    return viewport_width, viewport_height, max_capture_height
+
+def capture_region_cdp(driver, width, height, min_scale=0.0, max_pixels=None):
+    """Capture the top width x height region of the page in a single DevTools call.
+
+    Uses Page.captureScreenshot with captureBeyondViewport so the region
+    does not need to fit in the viewport. Expects the page scrolled to the
+    top, as get_capture_region() leaves it. Regions larger than max_pixels
+    (default: CDP_MAX_PIXELS) are scaled down by Chrome to fit, but never
+    below min_scale, the scale the renditions need, unless that would exceed
+    CDP_MAX_DIMENSION.
+
     Returns:
-        bool: True if successful, False otherwise
+        bytes: The captured region as PNG, left undecoded for post-processing
+    """
+    max_pixels = max_pixels or CDP_MAX_PIXELS
+    scale = min(1.0, max(min_scale, (max_pixels / (width * height)) ** 0.5))
+    limit = CDP_MAX_DIMENSION / max(width, height)
+    if scale > limit:
+        # A capture taller than Chrome can produce would fail or be truncated
+        upscaled = "; the renditions will be upscaled" if min_scale > limit else ""
+        logger.warning(f"Capturing {width}x{height} region at scale {limit:.3f} instead of {scale:.3f} to stay "
+                       f"within Chrome's {CDP_MAX_DIMENSION}px capture limit{upscaled}")
+        scale = limit
+    elif scale < 1.0:
+        logger.info(f"Capturing {width}x{height} region at scale {scale:.3f} to stay under {max_pixels} pixels")
+    return capture_clip(driver, {"x": 0, "y": 0, "width": width, "height": height}, scale)
+
+def capture_clip(driver, box, scale=1.0):
+    """Capture a box ({x, y, width, height} in page coordinates) in a single DevTools call.
+
+    Returns:
+        bytes: The captured box as PNG, scaled by scale
+    """
+    result = driver.execute_cdp_cmd("Page.captureScreenshot", {
+        "format": "png",
+        "captureBeyondViewport": True,
+        "clip": {"x": box["x"], "y": box["y"], "width": box["width"], "height": box["height"], "scale": scale},
+    })
+    return base64.b64decode(result["data"])
+
+def target_scale(width, height, target_width=TARGET_WIDTH, target_height=TARGET_HEIGHT):
+    """Return the factor resize_to_target() will scale a width x height image by."""
+    if width / height > target_width / target_height:
+        return target_height / height
+    return target_width / width
+
+def renditions_scale(width, height, renditions):
+    """Return the scale a width x height capture needs to serve its largest rendition."""
+    return max(target_scale(width, height, rendition.width, rendition.height) for rendition in renditions)
+
+def capture_region_emulated(driver, width, viewport_height, height, scale=None):
+    """Capture the top width x height region rasterized directly at the output scale.
+
+    Overrides the device scale factor with Emulation.setDeviceMetricsOverride
+    so Chrome paints the region at the output scale (default: the scale of
+    TARGET_WIDTH x TARGET_HEIGHT) instead of painting it at full size for us
+    to downsample. The CSS viewport is left unchanged so the page lays out
+    exactly as in the full render.
+
+    Returns:
+        bytes: The captured region at the output scale as PNG
     """
+    scale = scale or target_scale(width, height)
+    logger.info(f"Rendering {width}x{height} region at device scale factor {scale:.3f}")
+    driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+        "width": width,
+        "height": viewport_height,
+        "deviceScaleFactor": scale,
+        "mobile": False,
+    })
     try:
-        logger.info("Taking limited scroll screenshot...")
-        
-        # Get total height of the page
-        total_height = driver.execute_script(
-            "return Math.max(document.body.scrollHeight, document.body.offsetHeight, "
-            "document.documentElement.clientHeight, document.documentElement.scrollHeight, "
-            "document.documentElement.offsetHeight);"
-        )
-        logger.info(f"Total document height: {total_height}px")
-        
-        # Get viewport width and height
-        viewport_width = driver.execute_script("return document.documentElement.clientWidth")
-        viewport_height = driver.execute_script("return document.documentElement.clientHeight")
-        logger.info(f"Viewport dimensions: {viewport_width}x{viewport_height}")
-        
-        # Limit to approximately a third of the page (viewport height * 3)
-        max_capture_height = min(viewport_height * 3, total_height)
-        logger.info(f"Limiting screenshot to height: {max_capture_height}px")
-        
-        # Create a new image with the limited height
-        from PIL import Image
-        full_image = Image.new('RGB', (viewport_width, max_capture_height))
-        
-        # Scroll through the page and take screenshots, but only up to the maximum capture height
-        current_height = 0
-        while current_height < max_capture_height:
-            # Scroll to position
-            driver.execute_script(f"window.scrollTo(0, {current_height});")
-            time.sleep(2.0)  # Increased wait time to slow down scrolling
-            
-            # Take screenshot
-            screenshot = driver.get_screenshot_as_png()
-            image = Image.open(io.BytesIO(screenshot))
-            
-            # Calculate the portion of the screenshot to use
-            paste_height = min(viewport_height, max_capture_height - current_height)
-            
-            # Paste the screenshot at the correct position
-            full_image.paste(image.crop((0, 0, viewport_width, paste_height)), (0, current_height))
-            
-            # Calculate scrolling increment (use smaller increments for smoother scrolling)
-            scroll_increment = int(viewport_height * 0.5)  # Half of viewport height for overlap
-            current_height += scroll_increment
-            logger.info(f"Scrolled to position: {current_height}")
-            
-            # Stop if we've reached our target height
-            if current_height >= max_capture_height:
-                break
+        result = driver.execute_cdp_cmd("Page.captureScreenshot", {
+            "format": "png",
+            "captureBeyondViewport": True,
+            "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": 1},
+        })
+    finally:
+        driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+    return base64.b64decode(result["data"])
+
+class StreamingCompositor:
+    """Compose stitched screenshot tiles straight into an output-scale buffer.
+
+    Each tile is downsampled to the output scale as it arrives and only the
+    rows not already covered by an earlier tile are used, so memory stays at
+    one output-sized buffer plus the tile being processed, whatever the
+    capture height.
+    """
+
+    def __init__(self, width, height, scale):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.image = Image.new('RGB', (max(1, round(width * scale)), max(1, round(height * scale))))
+        self.composed_rows = 0
+
+    def add_tile(self, tile, top):
+        """Compose a tile whose first row is row top of the captured region.
+
+        Returns:
+            int: Number of new source rows composed from this tile
+        """
+        start = max(self.composed_rows, top)
+        end = min(top + tile.height, self.height)
+        if end <= start:
+            return 0
+        # Map whole output rows back to (fractional) source rows so bands join without seams
+        out_top = round(start * self.scale)
+        out_bottom = self.image.height if end == self.height else round(end * self.scale)
+        if out_bottom > out_top:
+            box = (0, out_top / self.scale - top, self.width, min(out_bottom / self.scale - top, tile.height))
+            band = tile.resize((self.image.width, out_bottom - out_top), Image.LANCZOS, box=box)
+            self.image.paste(band, (0, out_top))
+        self.composed_rows = end
+        return end - start
+
+def capture_region_stitch(driver, width, viewport_height, height, scale=1.0):
+    """Capture the top width x height region of the page by scrolling and stitching screenshots.
+
+    Args:
+        driver: The Selenium WebDriver
+        width: Width of the region
+        viewport_height: Height of the browser viewport
+        height: Height of the region
+        scale: Output scale the tiles are downsampled to as they arrive
+
+    Returns:
+        Image: The captured region at the given scale
+    """
+    compositor = StreamingCompositor(width, height, scale)
+    
+    # Scroll through the page and take screenshots, but only up to the maximum capture height
+    current_height = 0
+    while current_height < height:
+        # Scroll to position; the browser may clamp the offset at the end of the page
+        top = driver.execute_script(f"window.scrollTo(0, {current_height}); return window.pageYOffset;")
+        wait_for_page_ready(driver, f"stitch at {current_height}px", signals=("dom", "images"),
+                            quiet_ms=200, timeout_scale=0.2)
         
-        # Resize to 420 x 1250 while preserving aspect ratio
-        logger.info(f"Resizing screenshot from {full_image.width}x{full_image.height} without distortion")
+        # Take screenshot and compose only the rows not covered yet, then free the tile
+        with Image.open(io.BytesIO(driver.get_screenshot_as_png())) as screenshot:
+            new_rows = compositor.add_tile(screenshot.convert('RGB'), int(top))
+        logger.info(f"Composed {new_rows} new rows from tile at {int(top)}px")
         
-        # Target dimensions
-        target_width = 420
-        target_height = 1250
+        # Calculate scrolling increment (use smaller increments for smoother scrolling)
+        scroll_increment = int(viewport_height * 0.5)  # Half of viewport height for overlap
+        current_height += scroll_increment
+    return compositor.image
+
+def resize_to_target(full_image, target_width=TARGET_WIDTH, target_height=TARGET_HEIGHT):
+    """Resize an image to the target size without distortion.
+
+    Wide images are fitted to the target height and cropped from the center;
+    tall images are fitted to the target width, cropped from the top and
+    padded with white when they end up short.
+
+    Returns:
+        Image: The target_width x target_height image
+    """
+    # Resize to 420 x 1250 while preserving aspect ratio
+    logger.info(f"Resizing screenshot from {full_image.width}x{full_image.height} without distortion")
+    
+    # Calculate the aspect ratio of the original image and the target dimensions
+    original_ratio = full_image.width / full_image.height
+    target_ratio = target_width / target_height
+    
+    # Resize the image to fit either width or height while preserving aspect ratio
+    if original_ratio > target_ratio:
+        # Image is wider than target ratio, so fit to height and crop width
+        # Calculate width needed to maintain aspect ratio with target height
+        fit_width = int(target_height * original_ratio)
+        resized_temp = full_image.resize((fit_width, target_height), Image.LANCZOS)
         
-        # Calculate the aspect ratio of the original image and the target dimensions
-        original_ratio = full_image.width / full_image.height
-        target_ratio = target_width / target_height
+        # Crop from center to get target width
+        left = (fit_width - target_width) // 2
+        right = left + target_width
+        resized_image = resized_temp.crop((left, 0, right, target_height))
+        logger.info(f"Image was wider than target ratio: resized to {fit_width}x{target_height} then cropped width")
         
-        # Resize the image to fit either width or height while preserving aspect ratio
-        if original_ratio > target_ratio:
-            # Image is wider than target ratio, so fit to height and crop width
-            # Calculate width needed to maintain aspect ratio with target height
-            fit_width = int(target_height * original_ratio)
-            resized_temp = full_image.resize((fit_width, target_height), Image.LANCZOS)
-            
-            # Crop from center to get target width
-            left = (fit_width - target_width) // 2
-            right = left + target_width
-            resized_image = resized_temp.crop((left, 0, right, target_height))
-            logger.info(f"Image was wider than target ratio: resized to {fit_width}x{target_height} then cropped width")
-            
-        else:
-            # Image is taller than target ratio, so fit to width and crop height
-            # Calculate height needed to maintain aspect ratio with target width
-            fit_height = int(target_width / original_ratio)
-            resized_temp = full_image.resize((target_width, fit_height), Image.LANCZOS)
-            
-            # Crop from top to get target height (prioritize top content)
-            bottom = min(fit_height, target_height)
-            resized_image = resized_temp.crop((0, 0, target_width, bottom))
+    else:
+        # Image is taller than target ratio, so fit to width and crop height
+        # Calculate height needed to maintain aspect ratio with target width
+        fit_height = int(target_width / original_ratio)
+        resized_temp = full_image.resize((target_width, fit_height), Image.LANCZOS)
+        
+        # Crop from top to get target height (prioritize top content)
+        bottom = min(fit_height, target_height)
+        resized_image = resized_temp.crop((0, 0, target_width, bottom))
+        
+        # If the resized image is shorter than target height, create a new image with padding
+        if fit_height < target_height:
+            padded_image = Image.new('RGB', (target_width, target_height), (255, 255, 255))
+            padded_image.paste(resized_image, (0, 0))
+            resized_image = padded_image
+            logger.info(f"Image was taller than target ratio: resized to {target_width}x{fit_height} with padding if needed")
+    return resized_image
+
+def dhash(image, hash_size=8):
+    """Compute the difference hash of an image.
+
+    The image is shrunk to a tiny grayscale thumbnail and each bit records
+    whether a pixel is brighter than its right neighbour, then whether it is
+    brighter than the one below, which is stable under rescaling and small
+    rendering differences.
+
+    Returns:
+        int: A 2 * hash_size * hash_size bit hash
+    """
+    small = image.resize((hash_size + 1, hash_size + 1), Image.BOX).convert("L")
+    pixels = list(small.getdata())
+    width = hash_size + 1
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[row * width + col] > pixels[row * width + col + 1])
+    for row in range(hash_size):
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[row * width + col] > pixels[(row + 1) * width + col])
+    return value
+
+def hamming_distance(a, b):
+    """Return the number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+def image_fingerprint(image, grid=0):
+    """Return the whole-image hash of an image and, if grid is set, the hashes of its grid x grid regions."""
+    fingerprint = {"hash": dhash(image), "grid": []}
+    if grid:
+        cell_width, cell_height = image.width / grid, image.height / grid
+        for row in range(grid):
+            for col in range(grid):
+                box = (round(col * cell_width), round(row * cell_height),
+                       round((col + 1) * cell_width), round((row + 1) * cell_height))
+                fingerprint["grid"].append(dhash(image.crop(box)))
+    return fingerprint
+
+def compare_fingerprints(previous, fingerprint, threshold):
+    """Compare a fingerprint with the previous one.
+
+    The distance is the largest hash distance over the whole image and each
+    region.
+
+    Returns:
+        tuple: Whether the image changed and the distance (None without a previous fingerprint)
+    """
+    if not previous:
+        return True, None
+    distance = hamming_distance(previous["hash"], fingerprint["hash"])
+    if fingerprint["grid"] and len(previous.get("grid", [])) == len(fingerprint["grid"]):
+        distance = max([distance] + [hamming_distance(a, b) for a, b in zip(previous["grid"], fingerprint["grid"])])
+    return distance > threshold, distance
+
+class ChangeDetector:
+    """Skip captures that look the same as the last one saved for their target.
+
+    Perceptual hashes of the captured image (and optionally of an N x N grid
+    of its regions, to catch small localized changes) are compared against a
+    persisted index of the last saved capture per target. The hashing and
+    comparison run in process_capture; this class provides the baseline and
+    records the decisions.
+    """
+
+    def __init__(self, index_path=CHANGE_INDEX_PATH, threshold=CHANGE_THRESHOLD, grid=CHANGE_GRID):
+        self.index_path = index_path
+        self.threshold = threshold
+        self.grid = grid
+        self.processed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        try:
+            with open(index_path) as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+        except Exception as e:
+            logger.warning(f"Could not read change index {index_path}, starting empty: {e}")
+            self.index = {}
+
+    def baseline(self, key, output_path):
+        """Return the fingerprint of the last saved capture of key, or None if there is nothing to compare with.
+
+        The file checked is the one commit() recorded, which has the extension
+        of the primary rendition; output_path is only used for older entries.
+        """
+        with self._lock:
+            previous = self.index.get(key)
+        if not previous:
+            return None
+        return previous if os.path.exists(previous.get("output_path") or output_path) else None
+
+    def record(self, key, changed, distance):
+        """Count and log a processed/skipped decision."""
+        with self._lock:
+            if changed:
+                self.processed += 1
+            else:
+                self.skipped += 1
+            total = self.processed + self.skipped
+            logger.info(f"Change detection for {key}: distance {distance}, "
+                        f"{'processing' if changed else 'skipping unchanged capture'} "
+                        f"({self.skipped}/{total} skipped so far)")
+        METRICS.inc("fbshot_change_detection_total", decision="processed" if changed else "skipped")
+        note_capture(change_distance=distance, unchanged=not changed)
+
+    def commit(self, key, fingerprint, output_path):
+        """Record the fingerprint of a capture that was saved, and persist the index."""
+        with self._lock:
+            self.index[key] = dict(fingerprint, output_path=output_path, updated_at=time.time())
+            tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_path, self.index_path)
+            except Exception as e:
+                logger.warning(f"Could not save change index: {e}")
+
+class ScreenshotArchive:
+    """Content-addressed store of saved captures with an append-only index.
+
+    Layout under the archive directory:
+
+    - blobs/<hash[:2]>/<hash><ext>: each distinct image stored once, named by its SHA-256
+      and keeping the extension of the saved file (.png, .webp, .jpg)
+    - index.jsonl: one line per capture (target, timestamp, hash, extension, dimensions, bytes)
+    - latest/<target>.json: pointer to the newest capture of a target, replaced atomically
+
+    The index is loaded into memory once, so lookups never scan the blobs.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self._lock = threading.Lock()
+        self._entries = {}  # target -> entries sorted by timestamp
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "latest"), exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    if line.strip():
+                        self._insert(json.loads(line))
+        except FileNotFoundError:
+            pass
+
+    def _insert(self, entry):
+        entries = self._entries.setdefault(entry["target"], [])
+        position = bisect.bisect_right([e["timestamp"] for e in entries], entry["timestamp"])
+        entries.insert(position, entry)
+
+    def blob_path(self, digest, ext=".png"):
+        return os.path.join(self.directory, "blobs", digest[:2], f"{digest}{ext}")
+
+    def entry_path(self, entry):
+        """Return the blob of an index entry; entries without an extension predate non-PNG blobs."""
+        return self.blob_path(entry["hash"], entry.get("ext", ".png"))
+
+    def latest_path(self, target):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", target).strip("_")[:100]
+        key = hashlib.sha256(target.encode()).hexdigest()[:8]
+        return os.path.join(self.directory, "latest", f"{slug}-{key}.json")
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def add(self, target, filepath, timestamp=None):
+        """Archive a saved screenshot of a target.
+
+        Returns:
+            dict: The index entry of the capture
+        """
+        with open(filepath, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+        entry = {
+            "target": target,
+            "timestamp": timestamp if timestamp is not None else time.time(),
+            "hash": digest,
+            "ext": os.path.splitext(filepath)[1].lower() or ".png",
+            "width": width,
+            "height": height,
+            "bytes": len(data),
+        }
+        with self._lock:
+            blob_path = self.entry_path(entry)
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                self._write_atomic(blob_path, data)
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._insert(entry)
+            latest = self._entries[target][-1]
+            self._write_atomic(self.latest_path(target), json.dumps(
+                dict(latest, path=self.entry_path(latest))).encode())
+        logger.info(f"Archived capture of {target} as {digest[:12]} ({len(data)} bytes)")
+        return entry
+
+    def latest(self, target):
+        """Return the newest index entry of a target, or None."""
+        with self._lock:
+            entries = self._entries.get(target)
+            return dict(entries[-1], path=self.entry_path(entries[-1])) if entries else None
+
+    def captures(self, target=None, start=None, end=None):
+        """Return the index entries of one or all targets with start <= timestamp < end, oldest first."""
+        with self._lock:
+            targets = [target] if target is not None else list(self._entries)
+            results = []
+            for name in targets:
+                entries = self._entries.get(name, [])
+                timestamps = [e["timestamp"] for e in entries]
+                low = bisect.bisect_left(timestamps, start) if start is not None else 0
+                high = bisect.bisect_left(timestamps, end) if end is not None else len(entries)
+                results.extend(dict(e, path=self.entry_path(e)) for e in entries[low:high])
+        return sorted(results, key=lambda e: e["timestamp"])
+
+    def apply_retention(self, keep_last=ARCHIVE_KEEP_LAST, keep_days=ARCHIVE_KEEP_DAYS, now=None):
+        """Drop index entries outside the retention policy and delete blobs nothing references.
+
+        Per target, the newest keep_last captures (at least the newest one) are
+        kept, plus the newest capture of each of the last keep_days days.
+
+        Returns:
+            tuple: Number of index entries dropped and blobs deleted
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            dropped = []
+            for target, entries in self._entries.items():
+                # The newest entry is what latest/ points to, so it is always kept
+                keep = set(range(max(0, len(entries) - max(1, keep_last)), len(entries)))
+                seen_days = set()
+                for position in range(len(entries) - 1, -1, -1):
+                    timestamp = entries[position]["timestamp"]
+                    day = datetime.fromtimestamp(timestamp).date()
+                    if now - timestamp <= keep_days * 86400 and day not in seen_days:
+                        seen_days.add(day)
+                        keep.add(position)
+                dropped.extend(e for i, e in enumerate(entries) if i not in keep)
+                self._entries[target] = [e for i, e in enumerate(entries) if i in keep]
+            if not dropped:
+                return 0, 0
             
-            # If the resized image is shorter than target height, create a new image with padding
-            if fit_height < target_height:
-                padded_image = Image.new('RGB', (target_width, target_height), (255, 255, 255))
-                padded_image.paste(resized_image, (0, 0))
-                resized_image = padded_image
-                logger.info(f"Image was taller than target ratio: resized to {target_width}x{fit_height} with padding if needed")
-        
-        # Save the properly resized image
-        resized_image.save(filepath)
-        logger.info(f"Aspect-ratio preserved screenshot saved to {filepath} (420x1250)")
+            # Compact the index, then delete blobs no remaining entry points to
+            lines = "".join(json.dumps(e) + "\n" for entries in self._entries.values() for e in entries)
+            self._write_atomic(self.index_path, lines.encode())
+            referenced = {self.entry_path(e) for entries in self._entries.values() for e in entries}
+            deleted = 0
+            for blob_path in {self.entry_path(e) for e in dropped} - referenced:
+                try:
+                    os.remove(blob_path)
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Archive retention dropped {len(dropped)} entries and deleted {deleted} blobs")
+        return len(dropped), deleted
+
+RENDITION_FORMATS = {
+    # name: (PIL format, file extension, save options)
+    "png": ("PNG", ".png", {}),
+    "png-optimized": ("PNG", ".png", {"optimize": True}),
+    "webp": ("WEBP", ".webp", {"method": 4}),
+    "jpeg": ("JPEG", ".jpg", {"optimize": True}),
+}
+
+@dataclass
+class Rendition:
+    """An output size and encoding produced from each capture."""
+    width: int
+    height: int
+    format: str = "png"
+    quality: Optional[int] = None
+
+    def path(self, output_path, primary):
+        """Return where this rendition of output_path is written.
+
+        The primary rendition uses output_path itself (with the extension of
+        its format), the others get a _WIDTHxHEIGHT suffix.
+        """
+        root, ext = os.path.splitext(output_path)
+        format_ext = RENDITION_FORMATS[self.format][1]
+        if primary:
+            same_format = ext.lower() == format_ext or (ext.lower() == ".jpeg" and format_ext == ".jpg")
+            return output_path if same_format else root + format_ext
+        return f"{root}_{self.width}x{self.height}{format_ext}"
+
+def parse_renditions(spec):
+    """Parse a comma-separated "WIDTHxHEIGHT:FORMAT[:QUALITY]" list into Rendition entries."""
+    renditions = []
+    for item in spec.split(","):
+        parts = item.strip().split(":")
+        try:
+            width, height = (int(value) for value in parts[0].lower().split("x"))
+            rendition = Rendition(width, height, parts[1] if len(parts) > 1 else "png",
+                                  int(parts[2]) if len(parts) > 2 else None)
+        except ValueError:
+            raise ValueError(f"Invalid rendition '{item}', expected WIDTHxHEIGHT:FORMAT[:QUALITY]")
+        if rendition.format not in RENDITION_FORMATS:
+            raise ValueError(f"Unknown rendition format '{rendition.format}', "
+                             f"expected one of {', '.join(RENDITION_FORMATS)}")
+        renditions.append(rendition)
+    return renditions
+
+def decode_capture(payload):
+    """Turn a captured region into an RGB image.
+
+    The payload is an Image, ("png", bytes) as returned by the DevTools
+    capture, or ("raw", mode, size, bytes) for an already composed image.
+    """
+    if isinstance(payload, Image.Image):
+        return payload.convert("RGB")
+    if payload[0] == "raw":
+        _, mode, size, data = payload
+        return Image.frombytes(mode, size, data).convert("RGB")
+    with Image.open(io.BytesIO(payload[1])) as image:
+        return image.convert("RGB")
+
+def process_capture(payload, output_path, renditions, previous=None, threshold=None, grid=0):
+    """Decode a captured region once and write every rendition of it.
+
+    Runs inline or in a post-processing worker process. When threshold is
+    given the capture is first compared with the previous fingerprint and
+    nothing is written if it is unchanged.
+
+    Returns:
+        dict: Whether the capture changed, the hash distance and fingerprint,
+            the written outputs and per-step timings
+    """
+    timings = {}
+    start = time.monotonic()
+    image = decode_capture(payload)
+    timings["decode"] = time.monotonic() - start
+    
+    result = {"changed": True, "distance": None, "fingerprint": None, "outputs": [], "timings": timings}
+    if threshold is not None:
+        start = time.monotonic()
+        result["fingerprint"] = image_fingerprint(image, grid)
+        result["changed"], result["distance"] = compare_fingerprints(previous, result["fingerprint"], threshold)
+        timings["change_detection"] = time.monotonic() - start
+        if not result["changed"]:
+            return result
+    
+    timings["resize"] = timings["encode"] = 0.0
+    for index, rendition in enumerate(renditions):
+        start = time.monotonic()
+        resized = resize_to_target(image, rendition.width, rendition.height)
+        timings["resize"] += time.monotonic() - start
+        start = time.monotonic()
+        pil_format, _, options = RENDITION_FORMATS[rendition.format]
+        if rendition.quality is not None:
+            options = dict(options, quality=rendition.quality)
+        path = rendition.path(output_path, primary=index == 0)
+        resized.save(path, format=pil_format, **options)
+        timings["encode"] += time.monotonic() - start
+        result["outputs"].append({"path": path, "format": rendition.format, "width": rendition.width,
+                                  "height": rendition.height, "bytes": os.path.getsize(path)})
+    return result
+
+def complete_capture_output(result, key, change_detector=None, archive=None):
+    """Record the outcome of process_capture: change decision, fingerprint and archive entry."""
+    if change_detector is not None:
+        change_detector.record(key, result["changed"], result["distance"])
+    if not result["changed"]:
+        logger.info(f"Page unchanged, keeping existing screenshot for {key}")
+        return
+    primary = result["outputs"][0]
+    note_capture(image_bytes=primary["bytes"])
+    if change_detector is not None:
+        change_detector.commit(key, result["fingerprint"], primary["path"])
+    if archive is not None:
+        archive.add(key, primary["path"])
+    logger.info("Saved " + ", ".join(
+        f"{output['path']} ({output['width']}x{output['height']} {output['format']}, {output['bytes']} bytes)"
+        for output in result["outputs"]))
+
+class PostProcessor:
+    """Resize and encode captures on a process pool so the browser thread can move on.
+
+    The capture thread hands over the undecoded capture and returns at once;
+    the renditions are written by a worker process and the result is recorded
+    from the pool's callback thread.
+    """
+
+    def __init__(self, workers=POSTPROCESS_WORKERS, renditions=None):
+        self.renditions = renditions or parse_renditions(RENDITIONS)
+        # spawn: forking a process that runs WebDriver threads is not safe
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, payload, output_path, key, change_detector=None, archive=None):
+        """Queue a captured region for post-processing.
+
+        Returns:
+            Future: Resolves to the process_capture result
+        """
+        if isinstance(payload, Image.Image):
+            payload = ("raw", payload.mode, payload.size, payload.tobytes())
+        previous = change_detector.baseline(key, output_path) if change_detector else None
+        future = self.pool.submit(
+            process_capture, payload, output_path, self.renditions, previous,
+            change_detector.threshold if change_detector else None,
+            change_detector.grid if change_detector else 0
+        )
+
+        def done(future):
+            try:
+                result = future.result()
+                for name, seconds in result["timings"].items():
+                    METRICS.observe("fbshot_phase_duration_seconds", seconds, phase=name)
+                if result["outputs"]:
+                    METRICS.observe("fbshot_image_bytes", result["outputs"][0]["bytes"])
+                complete_capture_output(result, key, change_detector, archive)
+            except Exception as e:
+                METRICS.inc("fbshot_phase_failures_total", phase="postprocess")
+                logger.error(f"Post-processing of {key} failed: {e}")
+
+        future.add_done_callback(done)
+        return future
+
+    def shutdown(self):
+        """Wait for queued captures to be written and stop the workers."""
+        self.pool.shutdown(wait=True)
+
+def take_full_page_screenshot(driver, filepath, backend=None, render_mode=None, capture_viewports=None,
+                              change_detector=None, change_key=None, archive=None, renditions=None,
+                              postprocessor=None):
+    """Take a screenshot of the upper third of the page.
+    
+    Args:
+        driver: The Selenium WebDriver
+        filepath: The path where the screenshot should be saved
+        backend: "cdp" for a single DevTools capture, "stitch" to scroll and
+            stitch viewport screenshots, or "auto" (default: CAPTURE_BACKEND)
+            to try cdp and fall back to stitch
+        render_mode: "full" or "target" (default: RENDER_MODE); target
+            renders at the output scale and needs the cdp backend
+        capture_viewports: Height of the captured region in viewport
+            heights (default: CAPTURE_VIEWPORTS)
+        change_detector: Optional ChangeDetector; when the capture matches
+            the last one saved under change_key, it is not resized or written
+        change_key: The target the capture is compared against and archived under
+        archive: Optional ScreenshotArchive the saved screenshot is added to
+        renditions: Rendition list to write (default: RENDITIONS)
+        postprocessor: Optional PostProcessor; the capture is handed to it
+            and written in the background instead of inline
+    
+    Returns:
+        bool: True if successful (including skipped unchanged captures and
+            captures handed to the postprocessor), False otherwise
+    """
+    backend = backend or CAPTURE_BACKEND
+    render_mode = render_mode or RENDER_MODE
+    key = change_key or filepath
+    if renditions is None:
+        renditions = postprocessor.renditions if postprocessor is not None else parse_renditions(RENDITIONS)
+    try:
+        logger.info(f"Taking limited screenshot with the {backend} backend ({render_mode} render)...")
+        with capture_phase("measure"):
+            viewport_width, viewport_height, max_capture_height = get_capture_region(driver, capture_viewports)
+        
+        # Captures are sized for the largest rendition, so no rendition is enlarged
+        scale = renditions_scale(viewport_width, max_capture_height, renditions)
+        capture = None
+        if backend in ("auto", "cdp"):
+            try:
+                with capture_phase("capture_region"):
+                    if render_mode == "target":
+                        png = capture_region_emulated(driver, viewport_width, viewport_height, max_capture_height,
+                                                      scale)
+                    else:
+                        png = capture_region_cdp(driver, viewport_width, max_capture_height, min_scale=scale)
+                capture = ("png", png)
+            except Exception as e:
+                if backend == "cdp":
+                    raise
+                logger.warning(f"DevTools capture failed, falling back to scroll-and-stitch: {e}")
+        if capture is None:
+            with capture_phase("stitch"):
+                # Tiles are screenshots at full size, so they can only be scaled down
+                capture = capture_region_stitch(driver, viewport_width, viewport_height, max_capture_height,
+                                                min(1.0, scale))
+        
+        save_capture(capture, filepath, key, change_detector, archive, renditions, postprocessor)
         return True
         
     except Exception as e:
         logger.error(f"Error taking screenshot: {e}")
         return False
 
+def save_capture(capture, filepath, key, change_detector=None, archive=None, renditions=None, postprocessor=None):
+    """Write the renditions of a captured region, inline or through a PostProcessor.
+
+    Args:
+        capture: The captured region, as accepted by decode_capture()
+        filepath: The output path of the primary rendition
+        key: The target the capture is compared against and archived under
+    """
+    # Hand the capture off and let the browser move on to the next target
+    if postprocessor is not None:
+        with capture_phase("handoff"):
+            postprocessor.submit(capture, filepath, key, change_detector, archive)
+        logger.info(f"Screenshot for {key} handed off for post-processing")
+        return
+    
+    # Decode once, skip unchanged captures and write every rendition
+    result = process_capture(
+        capture, filepath, renditions or parse_renditions(RENDITIONS),
+        change_detector.baseline(key, filepath) if change_detector else None,
+        change_detector.threshold if change_detector else None,
+        change_detector.grid if change_detector else 0
+    )
+    recorder = current_capture()
+    if recorder is not None:
+        for name, seconds in result["timings"].items():
+            recorder.add_phase(name, seconds)
+    with capture_phase("archive" if archive is not None else "record"):
+        complete_capture_output(result, key, change_detector, archive)
+
+def union_box(boxes):
+    """Return the smallest box containing all boxes."""
+    left = min(box["x"] for box in boxes)
+    top = min(box["y"] for box in boxes)
+    right = max(box["x"] + box["width"] for box in boxes)
+    bottom = max(box["y"] + box["height"] for box in boxes)
+    return {"x": left, "y": top, "width": right - left, "height": bottom - top}
+
+def stack_cards(cards, gap=16, background=(240, 242, 245)):
+    """Stack card images vertically, centered, gap pixels apart."""
+    width = max(card.width for card in cards)
+    height = sum(card.height for card in cards) + gap * (len(cards) - 1)
+    image = Image.new("RGB", (width, height), background)
+    top = 0
+    for card in cards:
+        image.paste(card, ((width - card.width) // 2, top))
+        top += card.height + gap
+    return image
+
+def take_element_screenshot(driver, filepath, cards=False, posts=None, header_selector=None,
+                            change_detector=None, change_key=None, archive=None, renditions=None,
+                            postprocessor=None):
+    """Capture the page header and the first posts instead of the top of the page.
+
+    Only those elements are scrolled into view and waited for. Their union
+    box is captured in one DevTools call, or with cards each element is
+    captured on its own and the captures are stacked.
+
+    Args:
+        driver: The Selenium WebDriver
+        filepath: The path where the screenshot should be saved
+        cards: Capture the elements separately and stack them
+        posts: Number of posts to capture (default: CAPTURE_POSTS)
+        header_selector: CSS selector of the page header (default: HEADER_SELECTOR)
+        change_detector, change_key, archive, renditions, postprocessor:
+            As for take_full_page_screenshot()
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    posts = posts or CAPTURE_POSTS
+    header_selector = HEADER_SELECTOR if header_selector is None else header_selector
+    try:
+        with capture_phase("locate"):
+            regions = driver.execute_async_script(
+                ELEMENT_REGIONS_SCRIPT, header_selector, posts, READY_IMAGES_TIMEOUT_MS
+            )
+        if not regions["posts"]:
+            raise RuntimeError("no posts found")
+        logger.info(f"Located {'a header and ' if regions['header'] else ''}{len(regions['posts'])} posts, "
+                    f"{regions['images_loaded']}/{regions['images']} images loaded in {regions['elapsed_ms']}ms")
+        boxes = ([regions["header"]] if regions["header"] else []) + regions["posts"]
+        boxes = [box for box in boxes if box["width"] > 0 and box["height"] > 0]
+        
+        with capture_phase("capture_region"):
+            if cards:
+                tiles = []
+                for box in boxes:
+                    with Image.open(io.BytesIO(capture_clip(driver, box))) as tile:
+                        tiles.append(tile.convert("RGB"))
+                capture = stack_cards(tiles)
+            else:
+                capture = ("png", capture_clip(driver, union_box(boxes)))
+        
+        save_capture(capture, filepath, change_key or filepath, change_detector, archive, renditions, postprocessor)
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error taking element screenshot: {e}")
+        return False
+
+def run_batch(targets, workers=CAPTURE_WORKERS, headless=True, managers=None, **capture_kwargs):
+    """Capture a list of targets across a pool of concurrent browser workers.
+
+    Each worker owns one DriverManager and pulls targets from a shared queue
+    until it is empty. Passing managers keeps their warm sessions alive
+    across batches; otherwise the pool is created and closed per call.
+
+    Args:
+        targets: The CaptureTarget entries to capture
+        workers: The maximum number of concurrent browsers
+        headless: Whether the browsers run headless
+        managers: Optional DriverManager instances to use as the pool
+        **capture_kwargs: Extra arguments passed to capture_facebook_page
+
+    Returns:
+        list: One CaptureResult per target, in completion order
+    """
+    work = queue.Queue()
+    for target in targets:
+        work.put(target)
+    results = []
+    results_lock = threading.Lock()
+    owns_managers = managers is None
+    if owns_managers:
+        managers = [DriverManager(headless=headless) for _ in range(max(1, min(workers, len(targets))))]
+
+    def worker(index):
+        manager = managers[index]
+        while True:
+            try:
+                target = work.get_nowait()
+            except queue.Empty:
+                return
+            start = time.monotonic()
+            error = None
+            try:
+                success = manager.capture(url=target.url, output_path=target.output_path, **capture_kwargs)
+                if not success:
+                    error = "capture failed"
+            except Exception as e:
+                success = False
+                error = str(e)
+            result = CaptureResult(target, success, time.monotonic() - start, index, error)
+            logger.info(f"[worker {index}] {'OK' if success else 'FAILED'} {target.url} "
+                        f"-> {target.output_path} ({result.duration:.1f}s)")
+            with results_lock:
+                results.append(result)
+
+    worker_count = max(1, min(len(managers), len(targets)))
+    logger.info(f"Capturing {len(targets)} targets with {worker_count} workers")
+    threads = [threading.Thread(target=worker, args=(i,), name=f"capture-worker-{i}") for i in range(worker_count)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if owns_managers:
+            for manager in managers:
+                manager.close()
+    return results
+
+def report_batch(results, elapsed):
+    """Log per-target outcomes and overall throughput of a batch.
+
+    Returns:
+        dict: Summary with succeeded/failed counts and pages per minute
+    """
+    for result in results:
+        if result.success:
+            logger.info(f"Captured {result.target.url} in {result.duration:.1f}s")
+        else:
+            logger.error(f"Failed {result.target.url} after {result.duration:.1f}s: {result.error}")
+    succeeded = sum(1 for result in results if result.success)
+    pages_per_minute = len(results) * 60 / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Batch finished: {succeeded}/{len(results)} succeeded in {elapsed:.1f}s "
+                f"({pages_per_minute:.2f} pages/minute)")
+    return {
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed": elapsed,
+        "pages_per_minute": pages_per_minute,
+    }
+
+class Clock:
+    """Wall clock time source of the CaptureScheduler."""
+
+    def time(self):
+        return time.time()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(max(0.0, seconds))
+
+class FakeClock:
+    """A manually advanced clock, so schedules can be run without waiting.
+
+    Coroutines sleeping on it wake up in deadline order as advance() moves
+    time forward.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self._sleepers = []
+        self._sequence = 0
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + max(0.0, seconds), self._sequence, future))
+        self._sequence += 1
+        await future
+
+    @staticmethod
+    async def _settle(rounds=50):
+        # Let every runnable task run until it blocks again
+        for _ in range(rounds):
+            await asyncio.sleep(0)
+
+    async def advance(self, seconds):
+        """Move time forward by seconds, waking sleepers whose deadline passes."""
+        end = self.now + seconds
+        await self._settle()
+        while self._sleepers and self._sleepers[0][0] <= end:
+            deadline, _, future = heapq.heappop(self._sleepers)
+            if future.done():
+                continue
+            self.now = max(self.now, deadline)
+            future.set_result(None)
+            await self._settle()
+        self.now = end
+        await self._settle()
+
+class CaptureScheduler:
+    """Run each target on its own interval within global and per-domain concurrency limits.
+
+    Every run is shifted by up to +/- jitter of its interval so targets drift
+    apart instead of firing together. Targets that are overdue at startup
+    (missed while stopped, or new) run once each, spaced catch_up_spacing
+    seconds apart in priority order. The next-run times are saved to
+    state_path after every change, so a restart resumes the schedule.
+
+    capture(target) is either a blocking function, run in a worker thread,
+    or a coroutine function; it returns whether the capture succeeded.
+    """
+
+    def __init__(self, targets, capture, clock=None, state_path=SCHEDULE_STATE_PATH, max_concurrency=CAPTURE_WORKERS,
+                 per_domain=SCHEDULE_PER_DOMAIN, jitter=SCHEDULE_JITTER, catch_up_spacing=SCHEDULE_CATCHUP_SPACING,
+                 default_interval=SCREENSHOT_INTERVAL, rng=None, read_only=False):
+        self.targets = {target.url: target for target in targets}
+        self.capture = capture
+        self.clock = clock or Clock()
+        self.state_path = state_path
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_domain = max(1, per_domain)
+        self.jitter = jitter
+        self.catch_up_spacing = catch_up_spacing
+        self.default_interval = default_interval
+        self.rng = rng or random.Random()
+        self.read_only = read_only
+        self.state = {}
+        self._running = set()
+        self._domains = {}
+        self._tasks = set()
+        self._changed = None
+        self._executor = None
+
+    @staticmethod
+    def domain(url):
+        return urlparse(url).netloc.lower()
+
+    def interval(self, target):
+        return target.interval or self.default_interval
+
+    def next_interval(self, target):
+        """Return the target's interval shifted by the random jitter."""
+        return self.interval(target) * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def load_state(self):
+        """Load the saved schedule and line up overdue targets one catch_up_spacing apart."""
+        saved = {}
+        if self.state_path and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    saved = json.load(f).get("targets", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable schedule state {self.state_path}: {e}")
+        now = self.clock.time()
+        self.state = {url: dict(saved[url]) for url in self.targets if url in saved}
+        overdue = [
+            target for target in self.targets.values()
+            if self.state.get(target.url, {}).get("next_run", now) <= now
+        ]
+        overdue.sort(key=lambda target: (-target.priority, self.state.get(target.url, {}).get("next_run", now)))
+        for index, target in enumerate(overdue):
+            self.state.setdefault(target.url, {})["next_run"] = now + index * self.catch_up_spacing
+        if overdue:
+            logger.info(f"Scheduling {len(overdue)} overdue or new targets {self.catch_up_spacing:g}s apart")
+        self.save_state()
+
+    def save_state(self):
+        if not self.state_path or self.read_only:
+            return
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"targets": self.state}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def due_targets(self, now):
+        """Return idle targets whose next run has come, highest priority and most overdue first."""
+        due = [
+            target for url, target in self.targets.items()
+            if url not in self._running and self.state[url]["next_run"] <= now
+        ]
+        return sorted(due, key=lambda target: (-target.priority, self.state[target.url]["next_run"]))
+
+    def _dispatch(self, target, now):
+        entry = self.state[target.url]
+        late = now - entry["next_run"]
+        # Count the next interval from now, so a late run is not followed by a burst of catch-ups
+        entry["next_run"] = now + self.next_interval(target)
+        entry["last_started"] = now
+        self.save_state()
+        domain = self.domain(target.url)
+        self._running.add(target.url)
+        self._domains[domain] = self._domains.get(domain, 0) + 1
+        logger.info(f"Capturing {target.url} (priority {target.priority}, {late:.0f}s late), "
+                    f"next run at {datetime.fromtimestamp(entry['next_run']).strftime('%Y-%m-%d %H:%M:%S')}")
+        task = asyncio.ensure_future(self._run_target(target, domain, now))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_target(self, target, domain, started):
+        success = False
+        try:
+            if asyncio.iscoroutinefunction(self.capture):
+                success = await self.capture(target)
+            else:
+                loop = asyncio.get_running_loop()
+                success = await loop.run_in_executor(self._executor, self.capture, target)
+        except Exception as e:
+            logger.error(f"Scheduled capture of {target.url} failed: {e}")
+        finally:
+            self._running.discard(target.url)
+            self._domains[domain] -= 1
+            entry = self.state[target.url]
+            entry["last_success"] = bool(success)
+            entry["last_duration"] = self.clock.time() - started
+            self.save_state()
+            self._changed.set()
+
+    async def run(self, until=None):
+        """Run the schedule forever, or until the clock reaches until.
+
+        Captures still running at the end are waited for.
+        """
+        self._changed = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="capture")
+        self.load_state()
+        try:
+            while self.targets:
+                now = self.clock.time()
+                if until is not None and now >= until:
+                    break
+                for target in self.due_targets(now):
+                    if len(self._running) >= self.max_concurrency:
+                        break
+                    if self._domains.get(self.domain(target.url), 0) >= self.per_domain:
+                        continue
+                    self._dispatch(target, now)
+                
+                # Sleep until the next idle target is due, or a running capture frees a slot
+                waiting = [entry["next_run"] for url, entry in self.state.items()
+                           if url in self.targets and url not in self._running and entry["next_run"] > now]
+                wake = min(waiting) if waiting else None
+                if until is not None:
+                    wake = min(wake, until) if wake is not None else until
+                self._changed.clear()
+                waiters = [asyncio.ensure_future(self._changed.wait())]
+                if wake is not None:
+                    waiters.append(asyncio.ensure_future(self.clock.sleep(wake - now)))
+                _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in pending:
+                    waiter.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks)
+        finally:
+            self._executor.shutdown(wait=True)
+
+def run_scheduled(targets, managers, archive=None, archive_retention=(ARCHIVE_KEEP_LAST, ARCHIVE_KEEP_DAYS),
+                  scheduler_kwargs=None, **capture_kwargs):
+    """Capture targets on a CaptureScheduler schedule until interrupted.
+
+    Each concurrent capture borrows one of the warm DriverManager sessions,
+    so the global concurrency limit is the number of managers.
+    """
+    free = queue.Queue()
+    for manager in managers:
+        free.put(manager)
+
+    def capture(target):
+        manager = free.get()
+        try:
+            success = manager.capture(url=target.url, output_path=target.output_path, **capture_kwargs)
+        except Exception:
+            manager.close()
+            raise
+        finally:
+            free.put(manager)
+        if archive is not None:
+            archive.apply_retention(*archive_retention)
+        return success
+
+    scheduler = CaptureScheduler(targets, capture, max_concurrency=len(managers), **(scheduler_kwargs or {}))
+    asyncio.run(scheduler.run())
+
+def preview_schedule(targets, hours, capture_seconds=60, **scheduler_kwargs):
+    """Simulate the schedule on a FakeClock starting now and return the planned captures.
+
+    The saved schedule state is read but not changed.
+
+    Returns:
+        list: (start time, url) of every capture in the next hours
+    """
+    clock = FakeClock(time.time())
+    runs = []
+
+    async def fake_capture(target):
+        runs.append((clock.time(), target.url))
+        await clock.sleep(capture_seconds)
+        return True
+
+    async def simulate():
+        scheduler = CaptureScheduler(targets, fake_capture, clock=clock, read_only=True, **scheduler_kwargs)
+        end = clock.time() + hours * 3600
+        task = asyncio.ensure_future(scheduler.run(until=end))
+        while not task.done():
+            await clock.advance(min(capture_seconds, 60))
+        await task
+
+    asyncio.run(simulate())
+    return runs
+
+class CaptureCache:
+    """Finished captures kept on disk and indexed in memory, with a TTL and LRU eviction.
+
+    Files are named after the capture key, so the cache survives restarts;
+    entries older than ttl seconds are dropped when looked up, and the least
+    recently used ones once there are more than max_entries.
+    """
+
+    def __init__(self, directory=SERVICE_CACHE_DIR, ttl=SERVICE_CACHE_TTL, max_entries=SERVICE_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            key, ext = os.path.splitext(name)
+            if name.startswith("staging-"):
+                # Left behind by a capture that was interrupted
+                os.remove(os.path.join(directory, name))
+            elif re.fullmatch(r"[0-9a-f]{64}", key):
+                path = os.path.join(directory, name)
+                files.append((os.path.getmtime(path), key, path))
+        for created, key, path in sorted(files):
+            self._entries[key] = (path, created)
+        self._evict()
+
+    def staging_path(self, name):
+        """Return a path a capture can be written to before it is added with put()."""
+        return os.path.join(self.directory, f"staging-{name}.png")
+
+    def _drop(self, key):
+        path, _ = self._entries.pop(key)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def get(self, key):
+        """Return the path of a fresh cached capture, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path, created = entry
+            if time.time() - created > self.ttl or not os.path.exists(path):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return path
+
+    def put(self, key, filepath):
+        """Move a finished capture into the cache and return its cached path."""
+        path = os.path.join(self.directory, key + os.path.splitext(filepath)[1])
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            os.replace(filepath, path)
+            self._entries[key] = (path, time.time())
+            self._evict()
+        return path
+
+class ServiceBusy(Exception):
+    """Raised when the capture service's queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Capture queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class CaptureJob:
+    """An on-demand capture requested through the capture service."""
+
+    def __init__(self, key, url, options):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.url = url
+        self.options = options
+        self.status = "queued"
+        self.cached = False
+        self.error = None
+        self.path = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def finish(self, path=None, error=None):
+        self.path = path
+        self.error = error
+        self.status = "done" if path else "failed"
+        self.finished = time.time()
+        self.done.set()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "options": self.options,
+            "status": self.status,
+            "cached": self.cached,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "image": f"/captures/{self.id}/image" if self.status == "done" else None,
+        }
+
+def option_number(value, integral=False):
+    """Parse a numeric request option, rejecting booleans and, with integral, fractional values."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"expected a number, got {value!r}")
+    number = float(value)
+    if integral:
+        if not number.is_integer():
+            raise ValueError(f"expected a whole number, got {value!r}")
+        return int(number)
+    return number
+
+class CaptureService:
+    """Run on-demand captures on a pool of warm browsers.
+
+    Requests for a target and options that are already queued or running
+    join that capture instead of starting another, finished captures are
+    served from a CaptureCache, and new captures are refused with ServiceBusy
+    once queue_limit of them are waiting for a browser.
+    """
+
+    OPTIONS = {
+        "capture_backend": lambda value: value if value in CAPTURE_BACKENDS else None,
+        "render_mode": lambda value: value if value in RENDER_MODES else None,
+        "capture_viewports": lambda value: option_number(value) if 0 < option_number(value) <= 50 else None,
+        "capture_mode": lambda value: value if value in CAPTURE_MODES else None,
+        "capture_posts": lambda value: (option_number(value, integral=True)
+                                        if 0 < option_number(value, integral=True) <= 50 else None),
+        "zoom": lambda value: option_number(value) if 0.25 <= option_number(value) <= 2 else None,
+    }
+    # Values used when a request leaves an option out (unless the service was started with others)
+    OPTION_DEFAULTS = {
+        "capture_backend": CAPTURE_BACKEND,
+        "render_mode": RENDER_MODE,
+        "capture_viewports": CAPTURE_VIEWPORTS,
+        "capture_mode": CAPTURE_MODE,
+        "capture_posts": CAPTURE_POSTS,
+        "zoom": PAGE_ZOOM,
+    }
+
+    def __init__(self, managers, cache, queue_limit=SERVICE_QUEUE_LIMIT, max_jobs=1000, **capture_kwargs):
+        self.managers = managers
+        self.cache = cache
+        self.queue_limit = queue_limit
+        self.max_jobs = max_jobs
+        # Captures have to be written before they can be cached; only the primary rendition is served
+        renditions = capture_kwargs.get("renditions") or parse_renditions(RENDITIONS)
+        self.primary = renditions[0]
+        self.capture_kwargs = dict(capture_kwargs, postprocessor=None, change_detector=None,
+                                   renditions=[self.primary])
+        self.jobs = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._durations = []
+        self._workers = [
+            threading.Thread(target=self._worker, args=(manager,), name=f"service-{index}", daemon=True)
+            for index, manager in enumerate(managers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def normalize_options(self, options):
+        """Validate request options, raising ValueError for unknown or invalid ones.
+
+        Options equal to the service's default are dropped, so a request
+        spelling out a default shares its capture key with one leaving it out.
+        """
+        normalized = {}
+        for name, value in (options or {}).items():
+            if name not in self.OPTIONS:
+                raise ValueError(f"Unknown option '{name}', expected one of {', '.join(self.OPTIONS)}")
+            try:
+                normalized[name] = self.OPTIONS[name](value)
+            except (TypeError, ValueError):
+                normalized[name] = None
+            if normalized[name] is None:
+                raise ValueError(f"Invalid value for {name}: {value!r}")
+            default = self.capture_kwargs.get(name)
+            if normalized[name] == (self.OPTION_DEFAULTS[name] if default is None else default):
+                del normalized[name]
+        return normalized
+
+    @staticmethod
+    def capture_key(url, options):
+        return hashlib.sha256(json.dumps([url, options], sort_keys=True).encode()).hexdigest()
+
+    def retry_after(self):
+        """Estimate when a queue slot frees up, from recent capture durations."""
+        average = sum(self._durations) / len(self._durations) if self._durations else 30
+        return max(1, int(average * (self._queue.qsize() + 1) / len(self.managers)))
+
+    def _remember(self, job):
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            oldest = next(iter(self.jobs.values()))
+            if not oldest.done.is_set():
+                break
+            self.jobs.popitem(last=False)
+
+    def submit(self, url, options=None):
+        """Request a capture of url.
+
+        Returns:
+            tuple: The CaptureJob and how the request was served ("cached",
+                "coalesced" or "queued")
+        """
+        if urlparse(url).scheme not in ("http", "https"):
+            raise ValueError(f"Expected an http(s) URL, got {url!r}")
+        options = self.normalize_options(options)
+        key = self.capture_key(url, options)
+        with self._lock:
+            job = self._inflight.get(key)
+            cached_path = self.cache.get(key) if job is None else None
+            if job is not None:
+                outcome = "coalesced"
+            elif cached_path:
+                job = CaptureJob(key, url, options)
+                job.cached = True
+                job.finish(path=cached_path)
+                self._remember(job)
+                outcome = "cached"
+            elif self._queue.qsize() >= self.queue_limit:
+                METRICS.inc("fbshot_service_requests_total", outcome="rejected")
+                raise ServiceBusy(self.retry_after())
+            else:
+                job = CaptureJob(key, url, options)
+                self._inflight[key] = job
+                self._remember(job)
+                self._queue.put(job)
+                outcome = "queued"
+        METRICS.inc("fbshot_service_requests_total", outcome=outcome)
+        logger.info(f"Capture request for {url} {outcome} as job {job.id}")
+        return job, outcome
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _worker(self, manager):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status = "running"
+            staging = self.primary.path(self.cache.staging_path(job.id), primary=True)
+            start = time.monotonic()
+            try:
+                kwargs = dict(self.capture_kwargs, **job.options)
+                if manager.capture(url=job.url, output_path=staging, **kwargs) and os.path.exists(staging):
+                    job.finish(path=self.cache.put(job.key, staging))
+                else:
+                    job.finish(error="capture failed")
+            except Exception as e:
+                manager.close()
+                job.finish(error=str(e))
+            finally:
+                with self._lock:
+                    self._inflight.pop(job.key, None)
+                    self._durations = (self._durations + [time.monotonic() - start])[-20:]
+            logger.info(f"Job {job.id} for {job.url} {job.status} in {time.monotonic() - start:.1f}s")
+
+    def shutdown(self):
+        """Let queued captures finish and stop the workers."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+class CaptureServiceHandler(BaseHTTPRequestHandler):
+    """HTTP API of a CaptureService (available as server.service).
+
+    POST /captures              {"url": ..., "options": {...}, "wait": false}
+    GET  /captures/<id>         job status
+    GET  /captures/<id>/image   the captured image once the job is done
+    """
+
+    IMAGE_TYPES = {".png": "image/png", ".webp": "image/webp", ".jpg": "image/jpeg"}
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, job):
+        try:
+            with open(job.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._send(410, {"error": "the image was evicted from the cache", "job": job.to_dict()})
+            return
+        content_type = self.IMAGE_TYPES.get(os.path.splitext(job.path)[1], "application/octet-stream")
+        self._send(200, data, content_type, {"X-Capture-Id": job.id, "X-Cache": "HIT" if job.cached else "MISS"})
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/captures":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            job, outcome = self.server.service.submit(request.get("url", ""), request.get("options"))
+        except ServiceBusy as e:
+            self._send(429, {"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+            return
+        except (ValueError, AttributeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        if request.get("wait"):
+            job.done.wait(SERVICE_WAIT_TIMEOUT)
+            if job.status == "done":
+                self._send_image(job)
+                return
+            if job.status == "failed":
+                self._send(502, job.to_dict())
+                return
+        self._send(200 if job.status == "done" else 202, dict(job.to_dict(), outcome=outcome),
+                   headers={"Location": f"/captures/{job.id}"})
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        job = self.server.service.get(parts[1]) if len(parts) in (2, 3) and parts[0] == "captures" else None
+        if job is None or (len(parts) == 3 and parts[2] != "image"):
+            self._send(404, {"error": "not found"})
+        elif len(parts) == 2:
+            self._send(200, job.to_dict())
+        elif job.status != "done":
+            self._send(409, job.to_dict())
+        else:
+            self._send_image(job)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Capture service: {format % args}")
+
+def serve_captures(service, port, host=SERVICE_HOST):
+    """Serve the capture service API until interrupted."""
+    server = ThreadingHTTPServer((host, port), CaptureServiceHandler)
+    server.service = service
+    logger.info(f"Serving captures on http://{host}:{server.server_address[1]}/captures")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
 def main():
     """Main function to capture Facebook page screenshot."""
     logger.info("Starting Facebook screenshot process")
@@ -362,194 +3267,443 @@ def main():
     password = args.password or FB_PASSWORD
     headless = not args.disable_headless
     single_run = args.single_run
+    targets = build_targets(args)
     
-    # Continuous mode - run forever with interval
-    while True:
+    archive = ScreenshotArchive(args.archive_dir) if args.archive_dir else None
+    if args.archive_gc or args.archive_query:
+        if archive is None:
+            raise SystemExit("--archive-gc and --archive-query need --archive-dir or ARCHIVE_DIR")
+        if args.archive_gc:
+            archive.apply_retention(args.archive_keep_last, args.archive_keep_days)
+        if args.archive_query:
+            if args.archive_latest:
+                entries = [entry for entry in [archive.latest(args.archive_query)] if entry]
+            else:
+                since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+                until = datetime.fromisoformat(args.until).timestamp() if args.until else None
+                entries = archive.captures(args.archive_query, since, until)
+            for entry in entries:
+                print(json.dumps(entry))
+        return
+    
+    schedule_targets = targets or [CaptureTarget(FACEBOOK_URL, SCREENSHOT_PATH)]
+    try:
+        scheduler_kwargs = dict(
+            state_path=args.schedule_state,
+            per_domain=args.schedule_per_domain,
+            jitter=args.schedule_jitter,
+            default_interval=parse_duration(args.interval),
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.schedule_preview:
+        runs = preview_schedule(schedule_targets, args.schedule_preview, max_concurrency=args.workers,
+                                **scheduler_kwargs)
+        for start, url in runs:
+            print(f"{datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M:%S')}  {url}")
+        return
+    
+    global METRICS_LOG
+    METRICS_LOG = args.metrics_log
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    
+    try:
+        renditions = parse_renditions(args.renditions)
+        block_patterns = resolve_block_patterns(args.block_profile, args.block_pattern or BLOCK_PATTERNS)
+        phase_timeouts = parse_phase_timeouts(args.phase_timeout)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    postprocessor = PostProcessor(args.postprocess_workers, renditions) if args.postprocess_workers > 0 else None
+    
+    # Render mode - re-render a saved snapshot without visiting the site
+    if args.render_snapshot:
+        if len(args.render_snapshot) > 2:
+            raise SystemExit(f"--render-snapshot takes a snapshot and an optional output path, "
+                             f"got: {' '.join(args.render_snapshot)}")
+        path = args.render_snapshot[0]
+        output_path = (args.render_snapshot[1] if len(args.render_snapshot) > 1
+                       else os.path.splitext(path)[0] + "-render.png")
+        driver = setup_driver(headless=headless, profile=args.browser_profile)
         try:
-            # Get the current time for logging
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            logger.info(f"Running screenshot capture at {current_time}")
-            
-            driver = None
-            try:
-                driver = setup_driver(headless=headless)
-                capture_facebook_page(
-                    driver, 
-                    use_login=use_login,
-                    use_popup_login=use_popup_login,
-                    email=email,
-                    password=password
+            with record_capture(path) as recorder:
+                recorder.driver = driver
+                recorder.success = render_snapshot(
+                    driver, path, output_path, capture_mode=args.capture_mode,
+                    capture_backend=args.capture_backend, render_mode=args.render_mode,
+                    capture_viewports=args.capture_viewports, capture_posts=args.capture_posts, zoom=args.zoom,
+                    renditions=renditions, postprocessor=postprocessor
                 )
-                logger.info("Facebook screenshot process completed successfully")
-            except Exception as e:
-                logger.error(f"Error in screenshot process: {e}")
-            finally:
-                if driver:
-                    driver.quit()
-            
-            # If single run mode, exit after one iteration
-            if single_run:
-                logger.info("Single run mode - exiting")
-                break
-                
-            # Wait for the next interval
-            next_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            logger.info(f"Waiting until next capture cycle at {next_time}")
-            time.sleep(SCREENSHOT_INTERVAL)
-            
-        except KeyboardInterrupt:
-            logger.info("Process interrupted by user - exiting")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error in main loop: {e}")
-            # Wait a bit before trying again
-            time.sleep(60)
-
-def capture_facebook_page(driver, use_login=False, use_popup_login=False, email=None, password=None):
-    """Navigate to the Facebook page and capture a screenshot."""
+        finally:
+            driver.quit()
+            if postprocessor is not None:
+                postprocessor.shutdown()
+        if not recorder.success:
+            raise SystemExit(1)
+        return
+    
+    # Warm browser sessions are kept alive across capture cycles
+    if args.serve:
+        pool_size = max(1, args.workers)
+    else:
+        pool_size = max(1, min(args.workers, len(targets))) if targets else 1
+    managers = [
+        DriverManager(headless=headless, max_captures=args.driver_max_captures, max_age=args.driver_max_age,
+                      block_patterns=block_patterns, profile=args.browser_profile,
+                      rss_limit_mb=args.rss_limit_mb, phase_timeouts=phase_timeouts,
+                      trace_categories=TRACE_CATEGORIES if args.profile else None)
+        for _ in range(pool_size)
+    ]
+    capture_kwargs = dict(
+        use_login=use_login,
+        use_popup_login=use_popup_login,
+        email=email,
+        password=password,
+        capture_backend=args.capture_backend,
+        render_mode=args.render_mode,
+        capture_viewports=args.capture_viewports,
+        capture_mode=args.capture_mode,
+        capture_posts=args.capture_posts,
+        zoom=args.zoom,
+        save_snapshot=args.save_snapshot and not args.serve,
+        session_store=LoginSessionStore() if USE_SESSION_CACHE and not args.no_session_cache else None,
+        change_detector=(ChangeDetector(threshold=args.change_threshold, grid=args.change_grid)
+                         if args.skip_unchanged else None),
+        archive=archive,
+        renditions=renditions,
+        postprocessor=postprocessor
+    )
+    
     try:
-        # Use standard login if requested (before navigating to the target page)
-        if use_login and email and password and not use_popup_login:
-            success = login_to_facebook(driver)
+        # Profile mode - one capture under cProfile and a Chrome trace
+        if args.profile:
+            if args.serve or args.schedule:
+                raise SystemExit("--profile runs a single capture and cannot be combined with --serve or --schedule")
+            if len(targets) > 1:
+                logger.warning(f"--profile captures only the first of {len(targets)} targets")
+            target = targets[0] if targets else CaptureTarget(FACEBOOK_URL, SCREENSHOT_PATH)
+            success, _ = profile_capture(managers[0], args.profile, url=target.url,
+                                         output_path=target.output_path, **capture_kwargs)
             if not success:
-                logger.warning("Standard login failed, proceeding without login")
+                raise SystemExit(1)
+            return
         
-        # Navigate to the target Facebook page
-        logger.info(f"Navigating to Facebook page: {FACEBOOK_URL}")
-        driver.get(FACEBOOK_URL)
+        # Service mode - capture on request
+        if args.serve:
+            service = CaptureService(
+                managers, CaptureCache(args.cache_dir, args.cache_ttl, args.cache_max_entries),
+                queue_limit=args.queue_limit, **capture_kwargs
+            )
+            try:
+                serve_captures(service, args.serve)
+            except KeyboardInterrupt:
+                logger.info("Process interrupted by user - exiting")
+            finally:
+                service.shutdown()
+            return
         
-        # Give the page some time to load
-        time.sleep(5)
+        # Scheduler mode - every target on its own interval
+        if args.schedule:
+            try:
+                run_scheduled(schedule_targets, managers, archive=archive,
+                              archive_retention=(args.archive_keep_last, args.archive_keep_days),
+                              scheduler_kwargs=scheduler_kwargs, **capture_kwargs)
+            except KeyboardInterrupt:
+                logger.info("Process interrupted by user - exiting")
+            return
         
-        # If popup login is enabled, try to login using the popup
-        if use_popup_login and email and password:
-            success = login_via_popup(driver, email, password)
-            if not success:
-                logger.warning("Popup login failed, will try to remove the overlay instead")
-                remove_login_overlay(driver)
-        # Otherwise just remove the login overlay
-        elif not use_login:
-            remove_login_overlay(driver)
+        # Continuous mode - run forever with interval
+        while True:
+            try:
+                # Get the current time for logging
+                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                logger.info(f"Running screenshot capture at {current_time}")
+                
+                if targets:
+                    batch_start = time.monotonic()
+                    results = run_batch(targets, managers=managers, **capture_kwargs)
+                    report_batch(results, time.monotonic() - batch_start)
+                else:
+                    try:
+                        managers[0].capture(**capture_kwargs)
+                        logger.info("Facebook screenshot process completed successfully")
+                    except Exception as e:
+                        logger.error(f"Error in screenshot process: {e}")
+                        managers[0].close()
+                
+                if archive is not None:
+                    archive.apply_retention(args.archive_keep_last, args.archive_keep_days)
+                
+                # If single run mode, exit after one iteration
+                if single_run:
+                    logger.info("Single run mode - exiting")
+                    break
+                    
+                # Wait for the next interval
+                next_time = datetime.fromtimestamp(time.time() + SCREENSHOT_INTERVAL).strftime("%Y-%m-%d %H:%M:%S")
+                logger.info(f"Waiting until next capture cycle at {next_time}")
+                time.sleep(SCREENSHOT_INTERVAL)
+                
+            except KeyboardInterrupt:
+                logger.info("Process interrupted by user - exiting")
+                break
+            except Exception as e:
+                logger.error(f"Unexpected error in main loop: {e}")
+                # Wait a bit before trying again
+                time.sleep(60)
+    finally:
+        for manager in managers:
+            manager.close()
+        if postprocessor is not None:
+            postprocessor.shutdown()
+
+def load_page(driver, url):
+    """Navigate to url, stopping the load once it runs over PAGE_LOAD_TIMEOUT."""
+    try:
+        driver.get(url)
+    except TimeoutException:
+        # Capture whatever has loaded rather than waiting on slow subresources
+        logger.warning(f"Page load exceeded {PAGE_LOAD_TIMEOUT}s, stopping it")
+        driver.execute_script("window.stop();")
+
+def render_page(driver, output_path, key, capture_mode=None, capture_backend=None, render_mode=None,
+                capture_viewports=None, capture_posts=None, zoom=None, change_detector=None, archive=None,
+                renditions=None, postprocessor=None):
+    """Capture the page loaded in the driver, falling back to a plain screenshot.
+
+    This is the part of a capture that needs no network: it runs on the live
+    page in capture_facebook_page and on a saved snapshot in render_snapshot.
+    key identifies the page for change detection and the archive.
+
+    Returns:
+        bool: True if the capture or the fallback screenshot was saved
+    """
+    capture_mode = capture_mode or CAPTURE_MODE
+    zoom = zoom or PAGE_ZOOM
+    if capture_mode in ("elements", "cards"):
+        # Only the header and the first posts are brought into view and captured
+        success = take_element_screenshot(driver, output_path, cards=capture_mode == "cards",
+                                          posts=capture_posts, change_detector=change_detector,
+                                          change_key=key, archive=archive, renditions=renditions,
+                                          postprocessor=postprocessor)
+    else:
+        with capture_phase("preload"):
+            # Load every image of the capture region at once, measured at the capture zoom
+            preload = preload_images(driver, capture_viewports, zoom=zoom)
+            logger.info(f"Preloaded images in the top {preload['height']}px in {preload['elapsed_ms']}ms: "
+                        f"{preload['loaded']} loaded, {preload['failed']} failed, "
+                        f"{preload['timed_out']} timed out, {preload['no_source']} without source "
+                        f"({preload['images']} images, {preload['backgrounds']} backgrounds)")
         
-        # Wait for post content to load
-        logger.info("Waiting for posts to load completely")
-        try:
-            # Wait for articles to be present
-            WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.XPATH, "//div[@role='article']"))
-            )
-            # Additional wait time to ensure all visible content is fully loaded
-            time.sleep(10)
-            logger.info("Posts have loaded successfully")
-        except Exception as e:
-            logger.warning(f"Could not confirm all posts loaded, but continuing: {e}")
+        with capture_phase("zoom"):
+            # Scroll back to the top and set the page zoom level using JavaScript
+            logger.info(f"Scrolling back to the top and setting page zoom level to {zoom} ({zoom:.0%})")
+            zoom_state = driver.execute_script(APPLY_ZOOM_SCRIPT, zoom)
+            logger.info(f"Zoom set to {zoom_state['zoom']} at scroll position {zoom_state['scroll_y']}")
+            
+            # Wait for the zoomed layout to settle before taking the screenshot
+            wait_for_page_ready(driver, "zoom", signals=("dom", "fonts", "images"))
         
-        # Get the initial scroll position
-        initial_scroll_position = driver.execute_script("return window.pageYOffset;")
-        logger.info(f"Initial scroll position: {initial_scroll_position}")
+        # Take the full-page screenshot
+        success = take_full_page_screenshot(driver, output_path, backend=capture_backend,
+                                            render_mode=render_mode, capture_viewports=capture_viewports,
+                                            change_detector=change_detector, change_key=key, archive=archive,
+                                            renditions=renditions, postprocessor=postprocessor)
+    
+    # If the screenshot fails, fall back to a standard screenshot, encoded like any other capture
+    if not success:
+        logger.warning("Screenshot failed, falling back to standard screenshot")
+        with capture_phase("fallback_screenshot"):
+            save_capture(("png", driver.get_screenshot_as_png()), output_path, key, archive=archive,
+                         renditions=renditions)
+        logger.info(f"Standard screenshot saved for {key}")
+    
+    # Reset zoom
+    driver.execute_script(RESET_ZOOM_SCRIPT)
+    return True
+
+def snapshot_path(output_path):
+    """Return where the MHTML snapshot of the screenshot at output_path is saved."""
+    return os.path.splitext(output_path)[0] + ".mhtml"
+
+def save_page_snapshot(driver, path):
+    """Save the page as a self-contained MHTML file with Page.captureSnapshot.
+
+    The DOM is serialized as it is now, so removed overlays stay removed and
+    every loaded image, stylesheet and font is embedded; scripts are not.
+
+    Returns:
+        bool: True if the snapshot was saved
+    """
+    try:
+        data = driver.execute_cdp_cmd("Page.captureSnapshot", {"format": "mhtml"})["data"]
+        staging = f"{path}.tmp"
+        # MHTML uses CRLF line endings, which must survive the write
+        with open(staging, "w", encoding="utf-8", newline="") as f:
+            f.write(data)
+        os.replace(staging, path)
+        size = os.path.getsize(path)
+        note_capture(snapshot_bytes=size)
+        logger.info(f"Page snapshot saved to {path} ({size / 1e6:.2f}MB)")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving page snapshot: {e}")
+        return False
+
+def render_snapshot(driver, path, output_path, **render_kwargs):
+    """Render a saved MHTML snapshot offline.
+
+    The snapshot is loaded from file:// with the network emulated offline,
+    so only the resources embedded in it are used, then captured with
+    render_page, so any crop, size or zoom of the same page state can
+    be produced without visiting the site again.
+
+    Args:
+        driver: The Selenium WebDriver
+        path: The MHTML file saved by save_page_snapshot
+        output_path: Where to save the screenshot
+        **render_kwargs: Passed on to render_page
+
+    Returns:
+        bool: True if the snapshot was rendered
+    """
+    if not os.path.isfile(path):
+        logger.error(f"Snapshot {path} does not exist")
+        return False
+    uri = "file://" + os.path.abspath(path)
+    try:
+        with capture_phase("navigation"):
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.emulateNetworkConditions", {
+                "offline": True, "latency": 0, "downloadThroughput": -1, "uploadThroughput": -1,
+            })
+            logger.info(f"Loading page snapshot {uri}")
+            load_page(driver, uri)
+            wait_for_page_ready(driver, "navigation", signals=("dom", "fonts", "images"))
+        return render_page(driver, output_path, uri, **render_kwargs)
+    except Exception as e:
+        logger.error(f"Error rendering page snapshot: {e}")
+        return False
+
+def capture_facebook_page(driver, use_login=False, use_popup_login=False, email=None, password=None,
+                          url=None, output_path=None, capture_backend=None, render_mode=None,
+                          capture_viewports=None, session_store=None, change_detector=None, archive=None,
+                          renditions=None, postprocessor=None, capture_mode=None, capture_posts=None,
+                          zoom=None, save_snapshot=False):
+    """Navigate to the Facebook page and capture a screenshot.
+
+    url and output_path default to FACEBOOK_URL and SCREENSHOT_PATH. When a
+    LoginSessionStore is given, logged-in captures reuse its cached session;
+    with a ChangeDetector, captures that match the last saved one are skipped;
+    with a ScreenshotArchive, every saved screenshot is also archived. The
+    renditions are written inline, or in the background by a PostProcessor.
+    capture_mode (default: CAPTURE_MODE) picks scroll or element capture,
+    zoom (default: PAGE_ZOOM) the zoom of a scroll capture. With
+    save_snapshot, the page is also saved as MHTML next to the screenshot
+    for render_snapshot.
+    """
+    url = url or FACEBOOK_URL
+    output_path = output_path or SCREENSHOT_PATH
+    requests = getattr(driver, "request_counter", None)
+    if requests:
+        requests.reset()
+    counter = getattr(driver, "command_counter", None)
+    if counter:
+        counter.reset()
+    try:
+        wants_login = (use_login or use_popup_login) and email and password
         
-        # Try to remove the login banner again before scrolling
-        try:
-            remove_banner_script = """
-            // Find elements containing the login banner text
-            const allDivs = document.querySelectorAll('div');
-            let found = false;
+        with capture_phase("login"):
+            # Reuse a cached login session if there is one
+            restored = bool(wants_login and session_store and session_store.restore(driver, email))
             
-            for (const div of allDivs) {
-                if (div.textContent && div.textContent.includes('Log in or sign up for Facebook')) {
-                    // Navigate up to find a suitable parent to remove
-                    let target = div;
-                    for (let i = 0; i < 5; i++) {
-                        if (target.parentElement) {
-                            target = target.parentElement;
-                        }
-                    }
-                    target.remove();
-                    found = true;
-                    break;
-                }
-            }
-            
-            return found;
-            """
-            banner_removed = driver.execute_script(remove_banner_script)
-            if banner_removed:
-                logger.info("Removed login banner before scrolling")
-        except Exception as e:
-            logger.warning(f"Error trying to remove login banner: {e}")
+            # Use standard login if requested (before navigating to the target page)
+            if use_login and email and password and not use_popup_login and not restored:
+                success = login_to_facebook(driver)
+                if not success:
+                    logger.warning("Standard login failed, proceeding without login")
+                elif session_store:
+                    session_store.save(driver, email)
         
-        # Scroll only to 1/3 of the previous amount (approximately viewport height)
-        logger.info("Scrolling to load more posts (limited scroll)")
-        viewport_height = driver.execute_script("return window.innerHeight")
-        target_scroll_position = int(viewport_height * 0.8)  # Scroll to 80% of viewport height
+        with capture_phase("navigation"):
+            # Navigate to the target Facebook page
+            logger.info(f"Navigating to Facebook page: {url}")
+            load_page(driver, url)
+            
+            # Wait for the page to finish loading
+            wait_for_page_ready(driver, "navigation", signals=("dom", "network"))
         
-        logger.info(f"Target scroll position: {target_scroll_position}px")
+        # Fall back to a full login if the cached session was rejected
+        if restored and not session_store.validate(driver, email):
+            restored = False
+            if use_login and not use_popup_login:
+                with capture_phase("login"):
+                    if login_to_facebook(driver):
+                        session_store.save(driver, email)
+                    else:
+                        logger.warning("Standard login failed, proceeding without login")
+                with capture_phase("navigation"):
+                    load_page(driver, url)
+                    wait_for_page_ready(driver, "navigation", signals=("dom", "network"))
         
-        # Use a more robust scrolling method with explicit scroll targets
-        for current_scroll in range(0, target_scroll_position, 100):  # Smaller increments
-            # Scroll to specific position rather than relative scrolling
-            driver.execute_script(f"window.scrollTo(0, {current_scroll});")
-            logger.info(f"Scrolled to position: {current_scroll}")
-            
-            # Verify scroll position
-            actual_position = driver.execute_script("return window.pageYOffset;")
-            logger.info(f"Actual scroll position: {actual_position}")
-            
-            # Wait longer for content to load after each scroll
-            time.sleep(2)  # Increased wait time to slow down scrolling
-        
-        # One final scroll to the target position
-        driver.execute_script(f"window.scrollTo(0, {target_scroll_position});")
-        final_position = driver.execute_script("return window.pageYOffset;")
-        logger.info(f"Final scroll position: {final_position}")
-        
-        # Wait for content to load after scrolling
-        logger.info("Waiting 8 seconds for content to load after scrolling")
-        time.sleep(8)  # Increased wait time
-        
-        # Scroll back to the top
-        logger.info("Scrolling back to the top of the page")
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)  # Wait for scroll to complete
-        top_position = driver.execute_script("return window.pageYOffset;")
-        logger.info(f"Scrolled back to top position: {top_position}")
-        
-        # Set zoom level to 0.88 (88%) using JavaScript
-        logger.info("Setting page zoom level to 0.88 (88%)")
-        zoom_script = """
-        document.body.style.zoom = "0.88";
-        document.body.style.transformOrigin = "0 0";
-        document.body.style.transform = "scale(0.88)";
-        document.body.style.width = "114%";  /* 1/0.88 = ~1.14 */
-        return "Zoom level set to 0.88";
-        """
-        zoom_result = driver.execute_script(zoom_script)
-        logger.info(f"Zoom result: {zoom_result}")
+        with capture_phase("overlay"):
+            # A restored session is already logged in, so there is no popup or overlay
+            if restored:
+                logger.info("Using cached login session")
+            # If popup login is enabled, try to login using the popup
+            elif use_popup_login and email and password:
+                success = login_via_popup(driver, email, password)
+                if not success:
+                    logger.warning("Popup login failed, will try to remove the overlay instead")
+                    remove_login_overlay(driver)
+                elif session_store:
+                    session_store.save(driver, email)
+            # Otherwise just remove the login overlay
+            elif not use_login:
+                remove_login_overlay(driver)
         
-        # Wait a bit more before taking the screenshot
-        logger.info("Waiting 5 more seconds before taking screenshot")
-        time.sleep(5)
+        # Wait for post content to load
+        logger.info("Waiting for posts to load completely")
+        with capture_phase("posts_wait"):
+            try:
+                # Wait for articles to be present
+                WebDriverWait(driver, 30).until(
+                    EC.presence_of_element_located((By.XPATH, "//div[@role='article']"))
+                )
+                # Wait until the visible content is fully loaded
+                wait_for_page_ready(driver, "posts")
+                logger.info("Posts have loaded successfully")
+            except Exception as e:
+                recorder = current_capture()
+                if recorder:
+                    recorder.fail("posts_wait")
+                logger.warning(f"Could not confirm all posts loaded, but continuing: {e}")
         
-        # First try to take a full-page screenshot
-        success = take_full_page_screenshot(driver, SCREENSHOT_PATH)
+        # Remove the login banner and any other matching overlays in one pass
+        with capture_phase("overlay_removal"):
+            removed = remove_overlays(driver)
+        if removed:
+            logger.info(f"Removed {len(removed)} overlays before scrolling: "
+                        + ", ".join(f"<{item['tag']}> ({item['reason']})" for item in removed))
         
-        # If the full-page screenshot fails, fall back to a standard screenshot
-        if not success:
-            logger.warning("Full-page screenshot failed, falling back to standard screenshot")
-            driver.save_screenshot(SCREENSHOT_PATH)
-            logger.info(f"Standard screenshot saved to {SCREENSHOT_PATH}")
+        render_page(driver, output_path, url, capture_mode=capture_mode, capture_backend=capture_backend,
+                    render_mode=render_mode, capture_viewports=capture_viewports, capture_posts=capture_posts,
+                    zoom=zoom, change_detector=change_detector, archive=archive, renditions=renditions,
+                    postprocessor=postprocessor)
         
-        # Reset zoom
-        driver.execute_script("""
-        document.body.style.zoom = "1";
-        document.body.style.transform = "none";
-        document.body.style.width = "100%";
-        """)
+        if save_snapshot:
+            with capture_phase("snapshot"):
+                save_page_snapshot(driver, snapshot_path(output_path))
         
         return True
     except Exception as e:
         logger.error(f"Error capturing Facebook page: {e}")
         return False
+    finally:
+        if counter:
+            counter.report(f"Capture of {url}")
+        if requests:
+            requests.report(f"Requests of {url}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""Tests of the parts of facebook_screenshot that need no browser."""
+import asyncio
+import json
+import os
+import random
+from datetime import datetime
+
+import pytest
+from PIL import Image, ImageDraw
+
+import facebook_screenshot as fs
+
+
+def gradient(width, height):
+    """An image with structure in both directions, so hashes and resizes have something to work on."""
+    image = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 10):
+        draw.rectangle((0, y, width, y + 9), fill=(y * 255 // height, 80, 255 - y * 255 // height))
+    for x in range(0, width, width // 8):
+        draw.line((x, 0, x, height), fill=(255, 255, 255), width=3)
+    return image
+
+
+def run_schedule(targets, hours, start, state_path, capture_seconds=60, **kwargs):
+    """Run a CaptureScheduler on a FakeClock and return (offset from start, url) of every capture."""
+    clock = fs.FakeClock(start)
+    runs = []
+
+    async def capture(target):
+        runs.append((clock.time() - start, target.url))
+        await clock.sleep(capture_seconds)
+        return True
+
+    async def main():
+        scheduler = fs.CaptureScheduler(targets, capture, clock=clock, state_path=state_path,
+                                        rng=random.Random(1), **kwargs)
+        task = asyncio.ensure_future(scheduler.run(until=start + hours * 3600))
+        while not task.done():
+            await clock.advance(30)
+        await task
+
+    asyncio.run(main())
+    return runs
+
+
+# Scheduler
+
+def test_scheduler_jitters_each_interval(tmp_path):
+    target = fs.CaptureTarget("https://a.com/1", "a.png", interval=3600)
+    runs = run_schedule([target], 24, 1000.0, str(tmp_path / "state.json"), jitter=0.1)
+    gaps = [b - a for (a, _), (b, _) in zip(runs, runs[1:])]
+    assert len(runs) >= 20
+    # Runs are dispatched on the clock's 30s ticks, hence the slack
+    assert all(3600 * 0.9 <= gap <= 3600 * 1.1 + 30 for gap in gaps)
+    assert len({round(gap) for gap in gaps}) > 1
+
+
+def test_scheduler_spaces_overdue_targets_by_priority(tmp_path):
+    targets = [
+        fs.CaptureTarget("https://a.com/low", "a.png", interval=3600, priority=0),
+        fs.CaptureTarget("https://b.com/high", "b.png", interval=3600, priority=5),
+        fs.CaptureTarget("https://c.com/mid", "c.png", interval=3600, priority=1),
+    ]
+    runs = run_schedule(targets, 0.1, 1000.0, str(tmp_path / "state.json"), jitter=0,
+                        max_concurrency=3, catch_up_spacing=60)
+    assert runs == [(0.0, "https://b.com/high"), (60.0, "https://c.com/mid"), (120.0, "https://a.com/low")]
+
+
+def test_scheduler_resumes_saved_schedule(tmp_path):
+    state_path = str(tmp_path / "state.json")
+    target = fs.CaptureTarget("https://a.com/1", "a.png", interval=3600)
+    run_schedule([target], 0.5, 1000.0, state_path, jitter=0)
+    with open(state_path) as f:
+        next_run = json.load(f)["targets"]["https://a.com/1"]["next_run"]
+    assert next_run == pytest.approx(1000.0 + 3600)
+
+    # Restarted before the next run is due: nothing runs until then
+    runs = run_schedule([target], 1, 1000.0 + 1800, state_path, jitter=0)
+    assert runs == [(1800.0, "https://a.com/1")]
+
+
+def test_scheduler_limits_captures_per_domain(tmp_path):
+    targets = [fs.CaptureTarget(f"https://a.com/{i}", f"{i}.png", interval=3600) for i in range(3)]
+    runs = run_schedule(targets, 0.5, 0.0, str(tmp_path / "state.json"), capture_seconds=300, jitter=0,
+                        max_concurrency=3, per_domain=1, catch_up_spacing=0)
+    starts = [offset for offset, _ in runs]
+    assert len(starts) == 3
+    assert all(b - a >= 300 for a, b in zip(starts, starts[1:]))
+
+
+# Archive retention
+
+def archive_with_captures(tmp_path, timestamps):
+    archive = fs.ScreenshotArchive(str(tmp_path / "archive"))
+    for index, timestamp in enumerate(timestamps):
+        path = str(tmp_path / f"{index}.png")
+        Image.new("RGB", (4, 4), (index, 0, 0)).save(path)
+        archive.add("https://a.com", path, timestamp=timestamp)
+    return archive
+
+
+def test_retention_keeps_last_and_one_per_day(tmp_path):
+    day = 86400
+    now = datetime(2026, 1, 10, 12).timestamp()
+    # Two captures a minute apart around noon on each of the last four days
+    timestamps = [now - d * day - offset for d in range(3, -1, -1) for offset in (120, 60)]
+    archive = archive_with_captures(tmp_path, timestamps)
+    dropped, deleted = archive.apply_retention(keep_last=2, keep_days=2, now=now)
+    # Both of today's captures, plus the newest of yesterday's
+    kept = [entry["timestamp"] for entry in archive.captures("https://a.com")]
+    assert kept == [now - day - 60, now - 120, now - 60]
+    assert (dropped, deleted) == (5, 5)
+    assert all(os.path.exists(archive.entry_path(entry)) for entry in archive.captures("https://a.com"))
+
+
+def test_retention_always_keeps_latest(tmp_path):
+    archive = archive_with_captures(tmp_path, [1000, 2000, 3000])
+    archive.apply_retention(keep_last=0, keep_days=0, now=10 ** 9)
+    latest = archive.latest("https://a.com")
+    assert latest["timestamp"] == 3000
+    assert os.path.exists(archive.entry_path(latest))
+
+
+# Streaming compositor
+
+def test_streaming_compositor_matches_direct_resize():
+    page = gradient(800, 2400)
+    scale = 0.25
+    compositor = fs.StreamingCompositor(page.width, page.height, scale)
+    viewport = 600
+    # Half-viewport steps, with the last tile clamped to the end of the page like the browser does
+    for top in range(0, page.height, viewport // 2):
+        top = min(top, page.height - viewport)
+        compositor.add_tile(page.crop((0, top, page.width, top + viewport)), top)
+    assert compositor.composed_rows == page.height
+
+    expected = page.resize(compositor.image.size, Image.LANCZOS)
+    difference = sum(abs(a - b) for a, b in zip(compositor.image.tobytes(), expected.tobytes()))
+    assert difference / len(expected.tobytes()) < 2
+
+
+def test_streaming_compositor_skips_covered_rows():
+    compositor = fs.StreamingCompositor(100, 300, 1.0)
+    assert compositor.add_tile(Image.new("RGB", (100, 200)), 0) == 200
+    assert compositor.add_tile(Image.new("RGB", (100, 200)), 100) == 100
+    assert compositor.add_tile(Image.new("RGB", (100, 200)), 100) == 0
+
+
+# Change detection hashes
+
+def test_dhash_is_stable_under_rescaling():
+    image = gradient(840, 2500)
+    assert fs.hamming_distance(fs.dhash(image), fs.dhash(image.resize((420, 1250)))) <= 2
+
+
+def test_compare_fingerprints():
+    image = gradient(400, 1200)
+    fingerprint = fs.image_fingerprint(image, grid=4)
+    assert fs.compare_fingerprints(None, fingerprint, 4) == (True, None)
+    assert fs.compare_fingerprints(fingerprint, fs.image_fingerprint(image.copy(), grid=4), 4) == (False, 0)
+
+    changed = image.copy()
+    ImageDraw.Draw(changed).rectangle((0, 0, 100, 300), fill=(0, 0, 0))
+    whole_only = fs.compare_fingerprints(fs.image_fingerprint(image), fs.image_fingerprint(changed), 4)
+    with_grid = fs.compare_fingerprints(fingerprint, fs.image_fingerprint(changed, grid=4), 4)
+    # The grid catches a localized change at least as strongly as the whole-image hash
+    assert with_grid[1] >= whole_only[1]
+    assert with_grid[0]
+
+
+# Capture cache
+
+def cached_file(tmp_path, cache, name):
+    path = cache.staging_path(name)
+    Image.new("RGB", (4, 4)).save(path)
+    return path
+
+
+def test_capture_cache_evicts_least_recently_used(tmp_path):
+    cache = fs.CaptureCache(str(tmp_path), ttl=3600, max_entries=2)
+    keys = ["a" * 64, "b" * 64, "c" * 64]
+    cache.put(keys[0], cached_file(tmp_path, cache, "0"))
+    cache.put(keys[1], cached_file(tmp_path, cache, "1"))
+    assert cache.get(keys[0])
+    cache.put(keys[2], cached_file(tmp_path, cache, "2"))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) and cache.get(keys[2])
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{key}.png" for key in (keys[0], keys[2]))
+
+
+def test_capture_cache_expires_entries(tmp_path, monkeypatch):
+    cache = fs.CaptureCache(str(tmp_path), ttl=60, max_entries=10)
+    key = "d" * 64
+    path = cache.put(key, cached_file(tmp_path, cache, "0"))
+    assert cache.get(key) == path
+    now = fs.time.time()
+    monkeypatch.setattr(fs.time, "time", lambda: now + 61)
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
+
+
+def test_capture_cache_reloads_and_clears_staging(tmp_path):
+    cache = fs.CaptureCache(str(tmp_path))
+    key = "e" * 64
+    cache.put(key, cached_file(tmp_path, cache, "0"))
+    cached_file(tmp_path, cache, "left-behind")
+    reloaded = fs.CaptureCache(str(tmp_path))
+    assert reloaded.get(key)
+    assert not any(name.startswith("staging-") for name in os.listdir(tmp_path))
+
+
+# Capture service options
+
+@pytest.fixture
+def service(tmp_path):
+    service = fs.CaptureService([], fs.CaptureCache(str(tmp_path)))
+    yield service
+    service.shutdown()
+
+
+def test_normalize_options_validates(service):
+    assert service.normalize_options({"capture_posts": 5, "zoom": "0.5"}) == {"capture_posts": 5, "zoom": 0.5}
+    assert service.normalize_options({"capture_posts": 5.0}) == {"capture_posts": 5}
+    for options in ({"capture_posts": 1.7}, {"capture_posts": True}, {"zoom": False}, {"zoom": 5},
+                    {"capture_backend": "bad"}, {"capture_viewports": [1]}, {"unknown": 1}):
+        with pytest.raises(ValueError):
+            service.normalize_options(options)
+
+
+def test_default_options_share_a_capture_key(service):
+    url = "https://a.com"
+    explicit = service.normalize_options({"zoom": fs.PAGE_ZOOM, "capture_mode": fs.CAPTURE_MODE})
+    assert service.capture_key(url, explicit) == service.capture_key(url, service.normalize_options({}))
+    assert (service.capture_key(url, service.normalize_options({"zoom": 0.5}))
+            != service.capture_key(url, service.normalize_options({})))